@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import statistics
+import time
+from concurrent import futures
+import grpc
+import gossip_pb2
+import gossip_pb2_grpc
+from channel_pool import SERVER_KEEPALIVE_OPTIONS
+from node4 import Node
+
+# Benchmark of the initiator fan-out of node4.py in a full mesh of N nodes: time of
+# gossip_message to all N - 1 peers for
+#   fresh      - a new channel and a new GossipMessage for every peer (the old direct mail)
+#   sequential - pooled channels, one GossipMessage per peer, one peer after another
+#   once       - pooled channels, serialized once, sent to all peers concurrently
+# The peers are one gRPC server (in another process) listening on 127.0.x.y:5050
+# for every peer, so no cluster is needed. Each call waits --peer_delay_ms in the
+# peer, standing in for the network round trip and the handler of a remote pod
+# (on one box the peers otherwise compete with the initiator for the same cores):
+#
+# python bench_broadcast.py --nodes 10 50 100 200 --rounds 20 --peer_delay_ms 1
+#
+# The first round of the pooled modes includes opening the channels, the warm
+# median is what every later message pays.
+
+
+class Peer(gossip_pb2_grpc.GossipServiceServicer):
+    def __init__(self, delay_ms):
+        self.delay_ms = delay_ms
+
+    def SendMessage(self, request, context):
+        time.sleep(self.delay_ms / 1000)
+        return gossip_pb2.Acknowledgment(details=f"received: '{request.message}'")
+
+
+def serve(addresses, threads, delay_ms):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=threads), options=SERVER_KEEPALIVE_OPTIONS)
+    gossip_pb2_grpc.add_GossipServiceServicer_to_server(Peer(delay_ms), server)
+    for address in addresses:
+        server.add_insecure_port(f"{address}:5050")
+    server.start()
+    server.wait_for_termination()
+
+
+def peer_addresses(count):
+    return [f"127.0.{1 + i // 250}.{1 + i % 250}" for i in range(count)]
+
+
+def fresh_broadcast(node, message):
+    for peer_name, peer_ip in node.susceptible_nodes:
+        with grpc.insecure_channel(f"{peer_ip}:5050") as channel:
+            stub = gossip_pb2_grpc.GossipServiceStub(channel)
+            stub.SendMessage(gossip_pb2.GossipMessage(message=message, sender_id=node.host, timestamp=time.time_ns()))
+
+
+def run(num_nodes, rounds, threads, delay_ms):
+    addresses = peer_addresses(num_nodes - 1)
+    server = multiprocessing.Process(target=serve, args=(addresses, threads, delay_ms), daemon=True)
+    server.start()
+    time.sleep(1)
+
+    results = {}
+    for mode in ('fresh', 'sequential', 'once'):
+        # A node of its own per mode, so every mode starts without open channels
+        node = Node('bench')
+        node.host = 'bench-initiator'
+        node.broadcast_mode = mode
+        node.susceptible_nodes = [(f"peer-{i}", address) for i, address in enumerate(addresses)]
+        times = []
+        for i in range(rounds):
+            message = f"bench-{num_nodes}-{mode}-{i}"
+            start = time.perf_counter()
+            # node4 prints the peer list (and every opened channel), keep it out of the table
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == 'fresh':
+                    fresh_broadcast(node, message)
+                else:
+                    node.gossip_message(message, None)
+            times.append((time.perf_counter() - start) * 1000)
+        node.channels.close()
+        results[mode] = (times[0], statistics.median(times[1:] or times))
+
+    server.terminate()
+    server.join()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python bench_broadcast.py --nodes 10 50 100 --rounds 20")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[10, 50, 100, 200], help="Full mesh sizes N")
+    parser.add_argument('--rounds', type=int, default=20, help="Messages per mode")
+    parser.add_argument('--threads', type=int, default=100, help="Server threads of the peers")
+    parser.add_argument('--peer_delay_ms', type=float, default=1.0, help="Time every call takes in the peer")
+    args = parser.parse_args()
+
+    print(f"{'N':>6}{'mode':>12}{'first (ms)':>14}{'warm (ms)':>12}{'per peer (ms)':>16}", flush=True)
+    for num_nodes in args.nodes:
+        for mode, (first_ms, warm_ms) in run(num_nodes, args.rounds, args.threads, args.peer_delay_ms).items():
+            print(f"{num_nodes:>6}{mode:>12}{first_ms:>14.1f}{warm_ms:>12.2f}{warm_ms / (num_nodes - 1):>16.3f}",
+                  flush=True)
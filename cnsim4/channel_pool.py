@@ -0,0 +1,121 @@
+import inspect
+import asyncio
+import threading
+import grpc
+
+# Keepalive settings of the long-lived neighbor channels.
+# Pings keep idle connections (and NAT/conntrack entries) open between gossip rounds
+# and detect a dead neighbor without waiting for the next message.
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+# Server side counterpart, otherwise the server answers the pings above with GOAWAY (too_many_pings)
+SERVER_KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_ping_interval_without_data_ms', 10000),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+
+class ChannelPool:
+    """
+    Pool of persistent gRPC channels (and stubs), one per neighbor target ("ip:port").
+
+    Channels are created lazily on the first message to a neighbor and reused by every
+    message after that, so the TCP + HTTP/2 handshake is only paid once per edge.
+    A channel is dropped when a call to it fails with UNAVAILABLE and reconnected
+    on the next message. Works with grpc.insecure_channel (default) and
+    grpc.aio.insecure_channel as channel_factory.
+
+    get_method() gives a bytes-in/bytes-out callable of one method on the same
+    channel, for messages that are serialized once and sent to many targets.
+    """
+
+    def __init__(self, stub_class, options=None, channel_factory=grpc.insecure_channel):
+        self.stub_class = stub_class
+        self.options = KEEPALIVE_OPTIONS if options is None else options
+        self.channel_factory = channel_factory
+
+        self._lock = threading.Lock()
+        self._channels = {}  # target -> (channel, stub)
+        self._methods = {}  # (target, method) -> raw multi-callable
+        self.created = 0
+        self.reused = 0
+        self.reconnects = 0
+
+    def get_stub(self, target):
+        """Returns the stub of target, opening its channel if there is none yet."""
+        with self._lock:
+            entry, opened = self._get_entry(target)
+        if opened:
+            print(f"Opened channel to {target} ({self.stats_str()})", flush=True)
+        return entry[1]
+
+    def get_method(self, target, method):
+        """
+        Callable of method (e.g. '/gossip.GossipService/SendMessage') on the channel of target,
+        without (de)serializers: it takes the serialized request and returns the serialized response.
+        """
+        opened = False
+        with self._lock:
+            # The channel and its method under one lock, a close() or report_failure() in
+            # between could drop the channel
+            call = self._methods.get((target, method))
+            if call is not None:
+                self.reused += 1
+            else:
+                entry, opened = self._get_entry(target)
+                call = self._methods[(target, method)] = entry[0].unary_unary(method)
+        if opened:
+            print(f"Opened channel to {target} ({self.stats_str()})", flush=True)
+        return call
+
+    def _get_entry(self, target):
+        """(channel, stub) of target and whether it was opened just now. Call with the lock held."""
+        entry = self._channels.get(target)
+        if entry is not None:
+            self.reused += 1
+            return entry, False
+        channel = self.channel_factory(target, options=self.options)
+        entry = (channel, self.stub_class(channel))
+        self._channels[target] = entry
+        self.created += 1
+        return entry, True
+
+    def report_failure(self, target, error):
+        """Drops the channel of target after an unavailable error, so it is reconnected next time."""
+        if isinstance(error, grpc.RpcError) and error.code() != grpc.StatusCode.UNAVAILABLE:
+            return
+        with self._lock:
+            entry = self._channels.pop(target, None)
+            self._methods = {key: call for key, call in self._methods.items() if key[0] != target}
+            if entry is not None:
+                self.reconnects += 1
+        if entry is not None:
+            self._close_channel(entry[0])
+
+    def close(self):
+        with self._lock:
+            entries = list(self._channels.values())
+            self._channels.clear()
+            self._methods.clear()
+        for channel, _ in entries:
+            self._close_channel(channel)
+
+    def stats(self):
+        with self._lock:
+            return {'channels_open': len(self._channels), 'channels_created': self.created,
+                    'channels_reused': self.reused, 'channels_reconnected': self.reconnects}
+
+    def stats_str(self):
+        return ", ".join(f"{key}={value}" for key, value in self.stats().items())
+
+    def _close_channel(self, channel):
+        closing = channel.close()
+        # grpc.aio channels close asynchronously
+        if inspect.isawaitable(closing):
+            asyncio.ensure_future(closing)
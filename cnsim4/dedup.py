@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DIGEST_SIZE = 32
+
+
+def message_digest(message):
+    """Fixed-size (32 bytes) digest of a message, used as the dedup key instead of the message itself."""
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    return hashlib.sha256(message).digest()
+
+
+class DedupCache:
+    """
+    Bounded, expiring store of the messages a node has already seen.
+
+    Messages are keyed by their SHA-256 digest, so every entry has the same size
+    whatever the payload. Entries are kept in insertion order: the oldest ones are
+    evicted once there are more than `capacity` of them, or once they are older
+    than `ttl` seconds (ttl=0 disables expiry).
+    """
+
+    def __init__(self, capacity=100000, ttl=3600):
+        self.capacity = capacity
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> insertion time
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def check_and_add(self, message):
+        """Returns True if the message was seen before, otherwise records it and returns False."""
+        return self.check_and_add_digest(message_digest(message))
+
+    def check_and_add_digest(self, digest):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if digest in self._entries:
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            self._entries[digest] = now
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return False
+
+    def __contains__(self, message):
+        digest = message_digest(message)
+        with self._lock:
+            self._expire(time.monotonic())
+            return digest in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {'dedup_size': len(self._entries), 'dedup_hits': self.hits, 'dedup_misses': self.misses,
+                    'dedup_evictions': self.evictions, 'dedup_expirations': self.expirations}
+
+    def _expire(self, now):
+        if not self.ttl:
+            return
+        while self._entries:
+            digest, inserted = next(iter(self._entries.items()))
+            if now - inserted < self.ttl:
+                break
+            self._entries.popitem(last=False)
+            self.expirations += 1
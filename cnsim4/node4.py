@@ -1,13 +1,16 @@
-from kubernetes import client, config
 import grpc
 import os
 import socket
 from concurrent import futures
 import gossip_pb2
 import gossip_pb2_grpc
+from channel_pool import ChannelPool, SERVER_KEEPALIVE_OPTIONS
+from dedup import DedupCache
 import json
 import time
-from kubernetes import client, config
+
+# Full method name of SendMessage, for the pre-serialized broadcast
+SEND_MESSAGE_METHOD = '/gossip.GossipService/SendMessage'
 
 # Inspired from k8sv2
 class Node(gossip_pb2_grpc.GossipServiceServicer):
@@ -20,8 +23,16 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         self.app_name = 'bcgossip'
         # List to keep track of IPs of neighboring nodes
         self.susceptible_nodes = []
-        # Set to keep track of messages that have been received to prevent loops
-        self.received_message = ""
+        # Messages that have been received to prevent loops
+        # (bounded, entries expire after DEDUP_TTL seconds)
+        self.received_messages = DedupCache(capacity=int(os.getenv('DEDUP_CAPACITY', '100000')),
+                                            ttl=float(os.getenv('DEDUP_TTL', '3600')))
+        # Persistent channels to the peers, reused by every message
+        self.channels = ChannelPool(gossip_pb2_grpc.GossipServiceStub)
+        # Broadcast of an initiated message (from helm values)
+        # 'sequential' - a GossipMessage is built, serialized and sent to one peer after another
+        # 'once' - the message is serialized once and the same bytes are sent to all peers at once
+        self.broadcast_mode = os.getenv('BROADCAST_MODE', 'sequential')
         # self.gossip_initiated = False
 
     # def get_neighbours(self):
@@ -69,6 +80,8 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
     #     return self.susceptible_nodes
 
     def get_neighbours(self):
+        from kubernetes import client, config
+
         # Clear the existing list to refresh it
         self.susceptible_nodes = []
 
@@ -122,7 +135,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
 
         # For initiating acknowledgment only
         if sender_id == self.host:
-            self.received_message = message
+            self.received_messages.check_and_add(message)
             log_message = (f"Gossip initiated by {self.hostname} ({self.host}) at "
                            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(received_timestamp / 1e9))}")
             self._log_event(message, sender_id, received_timestamp, None,
@@ -132,12 +145,11 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
 
         # Check whether the message is already received ot not
         # Notify whether accept it or ignore it
-        elif self.received_message == message:
+        elif self.received_messages.check_and_add(message):
             log_message = f"{self.host} ignoring duplicate message: {message} from {sender_id}"
             self._log_event(message, sender_id, received_timestamp, None, 'duplicate', log_message)
             return gossip_pb2.Acknowledgment(details=f"Duplicate message ignored by ({self.host})")
         else:
-            self.received_message = message
             propagation_time = (received_timestamp - request.timestamp) / 1e6
             log_message = (f"({self.hostname}({self.host}) received: '{message}' from {sender_id}"
                            f" in {propagation_time:.2f} ms ")
@@ -152,6 +164,10 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
             self.get_neighbours()
         print(f"self.susceptible_nodes: {self.susceptible_nodes}",flush=True)
 
+        if self.broadcast_mode == 'once':
+            self.broadcast_once(message, sender_ip)
+            return
+
         # print(f"self.susceptible_nodes={self.susceptible_nodes}",flush=True)
         for peer_name, peer_ip in self.susceptible_nodes:
             # Exclude the sender from the list of nodes to forward the message to
@@ -160,16 +176,42 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
                 # Record the send timestamp
                 send_timestamp = time.time_ns()
 
-                with grpc.insecure_channel(f"{peer_ip}:5050") as channel:
-                    try:
-                        stub = gossip_pb2_grpc.GossipServiceStub(channel)
-                        stub.SendMessage(gossip_pb2.GossipMessage(
-                            message=message,
-                            sender_id=self.host,
-                            timestamp=send_timestamp,
-                        ))
-                    except grpc.RpcError as e:
-                        print(f"Failed to send message: '{message}' to {peer_ip}: {e}", flush=True)
+                target = f"{peer_ip}:5050"
+                stub = self.channels.get_stub(target)
+                try:
+                    stub.SendMessage(gossip_pb2.GossipMessage(
+                        message=message,
+                        sender_id=self.host,
+                        timestamp=send_timestamp,
+                    ))
+                except grpc.RpcError as e:
+                    self.channels.report_failure(target, e)
+                    print(f"Failed to send message: '{message}' to {peer_ip}: {e}", flush=True)
+
+    def broadcast_once(self, message, sender_ip):
+        """
+        Serializes the message once and sends the same bytes to every peer concurrently,
+        each call on the pooled channel of its peer. All peers get the same send timestamp.
+        """
+        payload = gossip_pb2.GossipMessage(
+            message=message,
+            sender_id=self.host,
+            timestamp=time.time_ns(),
+        ).SerializeToString()
+
+        calls = []
+        for peer_name, peer_ip in self.susceptible_nodes:
+            # Exclude the sender from the list of nodes to forward the message to
+            if peer_ip != sender_ip:
+                target = f"{peer_ip}:5050"
+                calls.append((target, peer_ip, self.channels.get_method(target, SEND_MESSAGE_METHOD).future(payload)))
+
+        for target, peer_ip, call in calls:
+            try:
+                call.result()
+            except grpc.RpcError as e:
+                self.channels.report_failure(target, e)
+                print(f"Failed to send message: '{message}' to {peer_ip}: {e}", flush=True)
 
     def _log_event(self, message, sender_id, received_timestamp, propagation_time, event_type, log_message):
         """Logs the gossip event as structured JSON data."""
@@ -188,7 +230,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
 
     def start_server(self):
         """ Initiating server """
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_KEEPALIVE_OPTIONS)
         gossip_pb2_grpc.add_GossipServiceServicer_to_server(self, server)
         server.add_insecure_port(f'[::]:{self.port}')
         print(f"{self.hostname}({self.host}) listening on port {self.port}", flush=True)
@@ -1,5 +1,6 @@
 import os
 import argparse
+import json
 import re
 import subprocess
 import sys
@@ -7,6 +8,7 @@ import traceback
 import time
 import uuid
 import select
+from datetime import datetime
 
 
 class Test:
@@ -144,12 +146,15 @@ class Test:
 
     def wait_for_pods_to_be_ready(self, namespace='default', expected_pods=0, timeout=1000):
         """
-                Waits for all pods in the specified namespace to be down
-                by checking every second until they are terminated or timeout is reached.
+                Waits for all pods in the specified namespace to be Ready (their gRPC health
+                service is SERVING, see the readinessProbe) by checking every second
+                until they are ready or timeout is reached.
         """
         print(f"Checking for pods in namespace {namespace}...", flush=True)
         start_time = time.time()
-        get_pods_cmd = f"kubectl get pods -n {namespace} --no-headers | grep Running | wc -l"
+        get_pods_cmd = (f"kubectl get pods -n {namespace} -l app=bcgossip -o jsonpath="
+                        "'{range .items[*]}{.status.conditions[?(@.type==\"Ready\")].status}{\"\\n\"}{end}'"
+                        " | grep -c True")
 
         while time.time() - start_time < timeout:
             try:
@@ -160,10 +165,11 @@ class Test:
                 # print(f"result {result}",flush=True)
                 running_pods = int(result.stdout.strip())
                 if running_pods >= expected_pods:
-                    print(f"All {expected_pods} pods are up and running in namespace {namespace}.", flush=True)
-                    return True  # Pods are down
+                    print(f"All {expected_pods} pods are ready in namespace {namespace}.", flush=True)
+                    self.report_startup_times(namespace)
+                    return True  # Pods are ready
                 else:
-                    print(f" {running_pods} pods are up for now in namespace {namespace}. Waiting...", flush=True)
+                    print(f" {running_pods} pods are ready for now in namespace {namespace}. Waiting...", flush=True)
 
             except subprocess.CalledProcessError as e:
                 print(f"Error checking for pods: {e.stderr}", flush=True)
@@ -174,6 +180,38 @@ class Test:
         print(f"Timeout waiting for pods to terminate in namespace {namespace}.", flush=True)
         return False  # Timeout reached
 
+    def report_startup_times(self, namespace='default'):
+        """
+        Prints how long the pods took from creation to Ready, and the gap between
+        their container Running and Ready (gRPC server serving), in seconds.
+        """
+        result = subprocess.run(f"kubectl get pods -n {namespace} -l app=bcgossip -o json", shell=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            pods = json.loads(result.stdout)['items']
+        except (ValueError, KeyError):
+            print(f"Could not read the pod startup times: {result.stderr}", flush=True)
+            return
+
+        def parse(timestamp):
+            return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ").timestamp()
+
+        to_ready = []
+        running_to_ready = []
+        for pod in pods:
+            ready = [c['lastTransitionTime'] for c in pod['status'].get('conditions', [])
+                     if c['type'] == 'Ready' and c['status'] == 'True']
+            running = [c['state']['running']['startedAt'] for c in pod['status'].get('containerStatuses', [])
+                       if 'running' in c['state']]
+            if ready and running:
+                to_ready.append(parse(ready[0]) - parse(pod['metadata']['creationTimestamp']))
+                running_to_ready.append(parse(ready[0]) - parse(running[0]))
+
+        if to_ready:
+            print(f"Pod startup of {len(to_ready)} pods: created to Ready avg={sum(to_ready) / len(to_ready):.1f}s "
+                  f"max={max(to_ready):.0f}s, Running to Ready avg={sum(running_to_ready) / len(running_to_ready):.1f}s "
+                  f"max={max(running_to_ready):.0f}s", flush=True)
+
     def wait_for_pods_to_be_down(self, namespace='default', timeout=1000):
         """
         Waits for all pods in the specified namespace to be down
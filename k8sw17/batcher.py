@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+
+
+class Batcher:
+    """
+    Per-neighbor coalescing queues for the SendBatch transport.
+
+    Messages for the same neighbor target are collected and sent together as one
+    batch, either as soon as there are max_batch_size of them or when the oldest
+    one has waited linger_ms. send_batch_fn(target, messages) does the actual call
+    and runs on the flush pool (max_workers threads, or the given executor), so a
+    slow neighbor doesn't hold up the others. The flush pool must not be one whose
+    threads wait for the batches (the sender pool), they would wait on themselves.
+    Every add() returns a Future that resolves with the acknowledgment of its batch.
+
+    The sizes of the batches sent are kept as a histogram (powers of two buckets)
+    and printed every report_interval seconds while there is traffic.
+    """
+
+    def __init__(self, send_batch_fn, executor=None, max_workers=8, max_batch_size=32, linger_ms=5,
+                 report_interval=10.0):
+        self.send_batch_fn = send_batch_fn
+        self._own_executor = executor is None
+        self.executor = executor or futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-flush")
+        self.max_batch_size = max_batch_size
+        self.linger = linger_ms / 1000
+        self.report_interval = report_interval
+
+        self._condition = threading.Condition()
+        self._queues = {}  # target -> (first added time, [(message, future)])
+        self._stopped = False
+
+        self.histogram = Counter()  # batch size bucket -> number of batches
+        self.batches = 0
+        self.messages = 0
+        self._last_report = time.monotonic()
+        self._last_report_count = 0
+
+        self._thread = threading.Thread(target=self._run, name="batcher", daemon=True)
+        self._thread.start()
+
+    def add(self, target, message):
+        future = futures.Future()
+        with self._condition:
+            if target not in self._queues:
+                self._queues[target] = (time.monotonic(), [])
+            batch = self._queues[target][1]
+            batch.append((message, future))
+            # Wake the flusher up for a full batch, or for a new linger deadline
+            if len(batch) >= self.max_batch_size or len(batch) == 1:
+                self._condition.notify()
+        return future
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._condition:
+            return {'batches_sent': self.batches, 'batched_messages': self.messages,
+                    'batch_size_histogram': dict(sorted(self.histogram.items()))}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due, next_deadline = self._take_due(time.monotonic())
+                while not due and not self._stopped:
+                    timeout = self.report_interval if next_deadline is None else next_deadline - time.monotonic()
+                    self._condition.wait(max(0.0, min(timeout, self.report_interval)))
+                    due, next_deadline = self._take_due(time.monotonic())
+                if self._stopped:
+                    due.extend(self._take_all())
+
+            for target, batch in due:
+                self.executor.submit(self._flush, target, batch)
+            self._maybe_report()
+            if self._stopped:
+                break
+
+    def _take_due(self, now):
+        """Pops the full or lingered batches. Returns them and the next linger deadline."""
+        due = []
+        next_deadline = None
+        for target, (first_added, batch) in list(self._queues.items()):
+            deadline = first_added + self.linger
+            if len(batch) >= self.max_batch_size or deadline <= now:
+                del self._queues[target]
+                # A batch never grows beyond max_batch_size, the rest stays for the next one
+                due.append((target, batch[:self.max_batch_size]))
+                if len(batch) > self.max_batch_size:
+                    self._queues[target] = (now, batch[self.max_batch_size:])
+                    next_deadline = now if next_deadline is None else min(next_deadline, now)
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        return due, next_deadline
+
+    def _take_all(self):
+        due = [(target, batch) for target, (_, batch) in self._queues.items()]
+        self._queues.clear()
+        return due
+
+    def _flush(self, target, batch):
+        with self._condition:
+            self.batches += 1
+            self.messages += len(batch)
+            self.histogram[1 << (len(batch) - 1).bit_length()] += 1
+        try:
+            ack = self.send_batch_fn(target, [message for message, _ in batch])
+            for _, future in batch:
+                future.set_result(ack)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        stats = self.stats()
+        if stats['batches_sent'] == self._last_report_count:
+            return
+        self._last_report_count = stats['batches_sent']
+        print(f"Batcher: batches_sent={stats['batches_sent']}, batched_messages={stats['batched_messages']}, "
+              f"batch_size_histogram={stats['batch_size_histogram']}", flush=True)
@@ -0,0 +1,121 @@
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent import futures
+import grpc
+import gossip_pb2
+import gossip_pb2_grpc
+import protocol
+from channel_pool import ChannelPool, SERVER_KEEPALIVE_OPTIONS
+from stream_transport import StreamPool
+
+# Benchmark of the unary (SendMessage) versus streaming (GossipStream) transport.
+# Based on the mininet/unary_server.py + unary_client.py experiment: a few local
+# receiver nodes (one process each) and one sender that pushes messages to all
+# of them, first unary then over one long-lived stream per node.
+#
+# python bench_transport.py --nodes 4 --messages 2000 --concurrency 8
+
+
+class Receiver(gossip_pb2_grpc.GossipServiceServicer):
+    """Receiving node, acknowledges every message (no forwarding)."""
+
+    def SendMessage(self, request, context):
+        return gossip_pb2.Acknowledgment(details="ok")
+
+    def GossipStream(self, request_iterator, context):
+        for request in request_iterator:
+            yield gossip_pb2.Acknowledgment(details="ok")
+
+
+def serve(port, ready):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16), options=SERVER_KEEPALIVE_OPTIONS)
+    gossip_pb2_grpc.add_GossipServiceServicer_to_server(Receiver(), server)
+    server.add_insecure_port(f'127.0.0.1:{port}')
+    server.start()
+    ready.set()
+    server.wait_for_termination()
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(transport, targets, num_messages, concurrency, payload_size):
+    channels = ChannelPool(gossip_pb2_grpc.GossipServiceStub)
+    streams = StreamPool(channels)
+    payload = b'x' * payload_size
+
+    def send(target, i):
+        request = protocol.new_message(payload + str(i).encode(), origin_id="bench", origin_timestamp=time.time_ns())
+        start = time.perf_counter()
+        if transport == 'stream':
+            streams.send(target, request).result()
+        else:
+            channels.get_stub(target).SendMessage(request)
+        return (time.perf_counter() - start) * 1000
+
+    # Warm up the channels (and streams) so the handshakes are not measured
+    for target in targets:
+        send(target, -1)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def sender(worker):
+        local = []
+        for i in range(worker, num_messages, concurrency):
+            for target in targets:
+                local.append(send(target, i))
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=sender, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    streams.close()
+    channels.close()
+    return {
+        'transport': transport,
+        'messages': len(latencies),
+        'msgs_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python bench_transport.py --nodes <n> --messages <m>")
+    parser.add_argument('--nodes', type=int, default=4, help="Number of local receiver nodes")
+    parser.add_argument('--base_port', type=int, default=6050, help="Port of the first receiver node")
+    parser.add_argument('--messages', type=int, default=2000, help="Messages sent to every node")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent sender threads")
+    parser.add_argument('--payload', type=int, default=256, help="Payload size in bytes")
+    args = parser.parse_args()
+
+    processes = []
+    targets = []
+    for n in range(args.nodes):
+        port = args.base_port + n
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=serve, args=(port, ready), daemon=True)
+        process.start()
+        ready.wait()
+        processes.append(process)
+        targets.append(f'127.0.0.1:{port}')
+
+    print(f"{'transport':<10}{'messages':>10}{'msgs/sec':>12}{'p50 (ms)':>10}{'p99 (ms)':>10}", flush=True)
+    for transport in ('unary', 'stream'):
+        result = run(transport, targets, args.messages, args.concurrency, args.payload)
+        print(f"{result['transport']:<10}{result['messages']:>10}{result['msgs_per_sec']:>12.0f}"
+              f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}", flush=True)
+
+    for process in processes:
+        process.terminate()
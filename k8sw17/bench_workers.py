@@ -0,0 +1,132 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent import futures
+import grpc
+import gossip_pb2
+import gossip_pb2_grpc
+import protocol
+from channel_pool import SERVER_KEEPALIVE_OPTIONS
+from dedup import SharedDedupTable
+from event_logger import EventLogger, JsonLineSink
+
+# Benchmark of the multi-process node server (SERVER_PROCESSES): throughput of the
+# receive path (upgrade, shared dedup, event logging) for 1, 2, 4 ... worker
+# processes sharing one port with SO_REUSEPORT. Every message is sent twice, so
+# the number of new (not duplicate) messages checks that the shared dedup table
+# is consistent across the workers. Run it on a multi-core pod, e.g.
+#
+# kubectl exec -it gossip-statefulset-0 -- python3 bench_workers.py --workers 1 2 4 --clients 4
+#
+# The clients are processes too, give the pod enough cores for both.
+
+
+class Receiver(gossip_pb2_grpc.GossipServiceServicer):
+    """Receive path of Node.SendMessage without the forwarding."""
+
+    def __init__(self, received_messages):
+        self.received_messages = received_messages
+        self.event_logger = EventLogger(JsonLineSink(open(os.devnull, 'wb')), asynchronous=False)
+
+    def SendMessage(self, request, context):
+        request = protocol.upgrade(request)
+        duplicate = self.received_messages.check_and_add_digest(request.message_id)
+        self.event_logger.log({
+            'message': protocol.text(request),
+            'sender_id': request.sender_id,
+            'receiver_id': 'bench',
+            'received_timestamp': time.time_ns(),
+            'propagation_time': (time.time_ns() - request.timestamp) / 1e6,
+            'latency_ms': request.latency_ms,
+            'event_type': 'duplicate' if duplicate else 'received',
+            'hop_count': request.hop_count,
+            'detail': f"bench received: '{protocol.text(request)}' from {request.sender_id}",
+        })
+        return gossip_pb2.Acknowledgment(details="duplicate" if duplicate else "new")
+
+
+def serve(port, received_messages, threads):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=threads),
+                         options=SERVER_KEEPALIVE_OPTIONS + [('grpc.so_reuseport', 1)])
+    gossip_pb2_grpc.add_GossipServiceServicer_to_server(Receiver(received_messages), server)
+    server.add_insecure_port(f'127.0.0.1:{port}')
+    server.start()
+    server.wait_for_termination()
+
+
+def client(port, client_id, num_messages, concurrency, results):
+    # Own channel per client process, so the connections are spread over the workers
+    channel = grpc.insecure_channel(f'127.0.0.1:{port}', options=[('grpc.use_local_subchannel_pool', 1)])
+    stub = gossip_pb2_grpc.GossipServiceStub(channel)
+    grpc.channel_ready_future(channel).result(timeout=10)
+    new = 0
+    lock = threading.Lock()
+
+    def sender(worker):
+        nonlocal new
+        count = 0
+        for i in range(worker, num_messages, concurrency):
+            # Each message twice, the second one must be a duplicate whichever worker gets it
+            request = protocol.new_message(f"bench-{client_id}-{i // 2}", origin_id=f"client-{client_id}",
+                                           origin_timestamp=time.time_ns())
+            if stub.SendMessage(request).details == "new":
+                count += 1
+        with lock:
+            new += count
+
+    threads = [threading.Thread(target=sender, args=(worker,)) for worker in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    channel.close()
+    results.put(new)
+
+
+def run(num_workers, port, num_clients, num_messages, concurrency, threads):
+    context = multiprocessing.get_context('fork')
+    received_messages = SharedDedupTable(capacity=4 * num_clients * num_messages, ttl=0, context=context)
+    workers = [context.Process(target=serve, args=(port, received_messages, threads), daemon=True)
+               for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    time.sleep(1)
+
+    results = context.Queue()
+    clients = [context.Process(target=client, args=(port, client_id, num_messages, concurrency, results))
+               for client_id in range(num_clients)]
+    start = time.perf_counter()
+    for process in clients:
+        process.start()
+    new = sum(results.get() for _ in clients)
+    elapsed = time.perf_counter() - start
+    for process in clients:
+        process.join()
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+
+    total = num_clients * num_messages
+    unique = num_clients * ((num_messages + 1) // 2)
+    return {'workers': num_workers, 'messages': total, 'msgs_per_sec': total / elapsed,
+            'new': new, 'unique': unique}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python bench_workers.py --workers 1 2 4 --clients 4")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Worker process counts to test")
+    parser.add_argument('--clients', type=int, default=4, help="Client processes")
+    parser.add_argument('--messages', type=int, default=4000, help="Messages per client (each one sent twice)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Sender threads per client")
+    parser.add_argument('--threads', type=int, default=10, help="Server threads per worker (SERVER_WORKERS)")
+    parser.add_argument('--port', type=int, default=6150, help="Port shared by the workers")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} cpus", flush=True)
+    print(f"{'workers':<10}{'messages':>10}{'msgs/sec':>12}{'new':>10}{'unique':>10}", flush=True)
+    for num_workers in args.workers:
+        result = run(num_workers, args.port, args.clients, args.messages, args.concurrency, args.threads)
+        print(f"{result['workers']:<10}{result['messages']:>10}{result['msgs_per_sec']:>12.0f}"
+              f"{result['new']:>10}{result['unique']:>10}", flush=True)
@@ -0,0 +1,335 @@
+import argparse
+import csv
+import math
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from gossip_sim import (GossipSimulator, EmulatedSimulator, load_topology, load_neighbors, read_events,
+                        first_receive_times, coverage_curve, coverage_time)
+
+# Calibration of the offline model (gossip_sim.py) against what the StatefulSet measured.
+#
+# Takes the events of a live test, the JSON lines the nodes log (kubectl logs of
+# every pod, or the virtual cluster) or a CSV of them (decode_events.py, or a
+# BigQuery export with received_timestamp as a TIMESTAMP), and the topology file
+# of the deployment. Every message found (one per automate.py test) is simulated
+# from its own initiator (the 'initiate' event), and the per-node first receive
+# times of the model are compared with the live ones.
+#
+# The overheads of the model (--fit, e.g. handler_ms and channel_setup_ms of the
+# emulation, or hop_overhead_ms of the ideal protocol) are then fitted to all
+# messages by least squares: Gauss-Newton on the first receive time residuals,
+# with the Jacobian by finite differences (the model is piecewise linear in the
+# overheads), the overheads kept >= 0. With the fitted overheads the model runs
+# on the --extrapolate topologies, e.g. node counts too large to deploy:
+#
+# python calibrate.py --topology topology/nodes300_Feb092025140642_BA2.json --events live.jsonl \
+#     --extrapolate topology/nodes1000_BA2.json --per_node calibration.csv
+#
+# The nodes keep their channels open (ChannelPool), so channel_setup_ms is only
+# paid by the first message of the events (test 1 of automate.py after the helm
+# install); give the events of one deployment, or --cold for every message. The
+# live times also include the clock offsets between the pods.
+
+PARAMETERS = {
+    'ideal': ('hop_overhead_ms',),
+    'emulation': ('handler_ms', 'rpc_ms', 'channel_setup_ms'),
+}
+DEFAULT_FIT = {'ideal': ['hop_overhead_ms'], 'emulation': ['handler_ms', 'channel_setup_ms']}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_ns(value):
+    """ns since the epoch of an integer timestamp (the JSON logs) or a BigQuery TIMESTAMP string."""
+    value = str(value).strip()
+    if value.lstrip('-').isdigit():
+        return int(value)
+    # 2025-02-09 14:06:42.123456 UTC
+    moment = datetime.fromisoformat(value.replace(' UTC', '+00:00').replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def read_csv_events(path):
+    """Gossip events of a CSV file (decode_events.py output or a BigQuery export)."""
+    events = []
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            if not row.get('event_type'):
+                continue
+            row['received_timestamp'] = to_ns(row['received_timestamp'])
+            row['hop_count'] = int(float(row['hop_count'])) if row.get('hop_count') else None
+            events.append(row)
+    return events
+
+
+def load_live_events(paths):
+    events = []
+    for path in paths:
+        events.extend(read_csv_events(path) if path.endswith('.csv') else read_events(path))
+    return events
+
+
+def split_messages(events):
+    """Events of every message, in the order the messages appear."""
+    messages = {}
+    for event in events:
+        messages.setdefault(event['message'], []).append(event)
+    return messages
+
+
+def first_hops(events):
+    hops = {}
+    for event in sorted(events, key=lambda event: event['received_timestamp']):
+        if event['event_type'] == 'received':
+            hops.setdefault(event['receiver_id'], event['hop_count'])
+    return hops
+
+
+class Model:
+    """The offline model of one topology, the overheads given per run."""
+
+    def __init__(self, neighbors, mode='emulation', ttl=0, settings=None):
+        self.neighbors = neighbors
+        self.mode = mode
+        self.ttl = ttl
+        self.settings = settings or {}
+        self.runs = 0
+
+    def run(self, initiator, overheads):
+        self.runs += 1
+        if self.mode == 'ideal':
+            simulator = GossipSimulator(self.neighbors, ttl=self.ttl, **overheads)
+        else:
+            simulator = EmulatedSimulator(self.neighbors, ttl=self.ttl, **self.settings, **overheads)
+        return simulator.run(initiator, 'calibration', start_ns=0)
+
+    def first_receive(self, initiator, overheads):
+        return first_receive_times(self.run(initiator, overheads))[1]
+
+
+class Calibration:
+    """
+    Residuals (model - live, ms) of the first receive times of every message,
+    and the least-squares fit of the overheads in names.
+
+    A live node the model never reaches (it stalls or stops short) has no
+    residual, it adds penalty_ms squared to the cost instead (default: the
+    slowest live first receive time), so overheads that lose nodes are never
+    taken for a better fit.
+    """
+
+    def __init__(self, model, samples, names, fixed=None, penalty_ms=None):
+        self.model = model
+        self.samples = samples  # (message, initiator, {node: live ms}, cold)
+        self.names = names
+        self.fixed = fixed or {}
+        if penalty_ms is None:
+            penalty_ms = max((max(live.values(), default=0.0) for _, _, live, _ in samples), default=0.0) or 1.0
+        self.penalty_ms = penalty_ms
+        self.rank = len(names)
+
+    def overheads(self, values, cold=True):
+        overheads = {**self.fixed, **{name: float(value) for name, value in zip(self.names, values)}}
+        if not cold and 'channel_setup_ms' in overheads:
+            # The channels are open from an earlier message
+            overheads['channel_setup_ms'] = 0.0
+        return overheads
+
+    def residuals(self, values):
+        """Model - live of every node reached in both, nan where the model never reaches a live node."""
+        residuals = []
+        for _, initiator, live, cold in self.samples:
+            times = self.model.first_receive(initiator, self.overheads(values, cold))
+            residuals.extend(times[node] - elapsed if node in times else math.nan for node, elapsed in live.items())
+        return np.array(residuals)
+
+    def cost(self, residuals):
+        """Sum of the squared residuals, penalty_ms squared for every node without one."""
+        missing = np.isnan(residuals)
+        return float(np.sum(residuals[~missing] ** 2) + np.count_nonzero(missing) * self.penalty_ms ** 2)
+
+    def fit(self, start=None, iterations=20, delta_ms=1.0, tolerance_ms=0.01):
+        """Fitted overheads (>= 0), the cost (see cost()) and the iterations used."""
+        values = np.zeros(len(self.names)) if start is None else np.array(start, dtype=float)
+        residuals = self.residuals(values)
+        cost = self.cost(residuals)
+        for iteration in range(1, iterations + 1):
+            jacobian = np.empty((len(residuals), len(self.names)))
+            for k in range(len(self.names)):
+                shifted = values.copy()
+                shifted[k] += delta_ms
+                jacobian[:, k] = (self.residuals(shifted) - residuals) / delta_ms
+            # The step only from the nodes the model reaches in every run, the line search
+            # below judges it with the penalty of the others
+            rows = ~np.isnan(jacobian).any(axis=1)
+            if not rows.any():
+                return values, cost, iteration
+            # Overheads the messages cannot tell apart (e.g. channel_setup_ms without warm
+            # messages) share their sum, the minimum norm solution
+            step, _, self.rank, _ = np.linalg.lstsq(jacobian[rows], -residuals[rows], rcond=None)
+
+            # Halve the step until the cost goes down, the model is only piecewise linear
+            scale = 1.0
+            while scale >= 1 / 64:
+                candidate = np.maximum(values + scale * step, 0.0)
+                candidate_residuals = self.residuals(candidate)
+                candidate_cost = self.cost(candidate_residuals)
+                if candidate_cost < cost:
+                    break
+                scale /= 2
+            else:
+                return values, cost, iteration
+
+            change = np.max(np.abs(candidate - values))
+            values, residuals, cost = candidate, candidate_residuals, candidate_cost
+            if change < tolerance_ms:
+                return values, cost, iteration
+        return values, cost, iterations
+
+
+def error_stats(residuals):
+    matched = residuals[~np.isnan(residuals)]
+    if not len(matched):
+        return {'nodes': 0, 'unmatched': len(residuals)}
+    return {
+        'nodes': len(matched),
+        'unmatched': len(residuals) - len(matched),
+        'bias_ms': float(np.mean(matched)),
+        'mae_ms': float(np.mean(np.abs(matched))),
+        'rmse_ms': float(np.sqrt(np.mean(matched ** 2))),
+        'p90_abs_ms': float(np.percentile(np.abs(matched), 90)),
+        'max_abs_ms': float(np.max(np.abs(matched))),
+    }
+
+
+def write_per_node(path, calibration, live_events, values):
+    """CSV of the live, uncalibrated and calibrated first receive time and hops of every node of every message."""
+    model = calibration.model
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['message', 'node', 'live_ms', 'model_ms', 'calibrated_ms', 'error_ms',
+                         'live_hop_count', 'model_hop_count'])
+        for message, initiator, live, cold in calibration.samples:
+            uncalibrated = model.first_receive(initiator, calibration.overheads([0.0] * len(values), cold))
+            events = model.run(initiator, calibration.overheads(values, cold))
+            calibrated = first_receive_times(events)[1]
+            live_hops = first_hops(live_events[message])
+            model_hops = first_hops(events)
+            for node, elapsed in sorted(live.items(), key=lambda item: item[1]):
+                calibrated_ms = calibrated.get(node)
+                writer.writerow([message, node, f"{elapsed:.3f}",
+                                 '' if node not in uncalibrated else f"{uncalibrated[node]:.3f}",
+                                 '' if calibrated_ms is None else f"{calibrated_ms:.3f}",
+                                 '' if calibrated_ms is None else f"{calibrated_ms - elapsed:.3f}",
+                                 live_hops.get(node, ''), model_hops.get(node, '')])
+
+
+def print_stats(label, stats):
+    if not stats['nodes']:
+        print(f"  {label:<14}no node reached by both", flush=True)
+        return
+    print(f"  {label:<14}bias={stats['bias_ms']:.2f}  mae={stats['mae_ms']:.2f}  rmse={stats['rmse_ms']:.2f}  "
+          f"p90|err|={stats['p90_abs_ms']:.2f}  max|err|={stats['max_abs_ms']:.2f} ms "
+          f"({stats['nodes']} nodes, {stats['unmatched']} not reached by the model)", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python calibrate.py --topology <json> --events <jsonl or csv> [--extrapolate <json> ...]")
+    parser.add_argument('--topology', required=True, help="Topology JSON of the deployment the events come from")
+    parser.add_argument('--events', nargs='+', required=True, help="JSON lines logs of the nodes or CSV (decode_events.py, BigQuery export)")
+    parser.add_argument('--message', nargs='*', default=[], help="Only these messages (default: every message with an 'initiate' event)")
+    parser.add_argument('--latency_option', default='weight', help="Edge attribute used as latency (LATENCY_OPTION)")
+    parser.add_argument('--ttl', type=int, default=0, help="Maximum hops (GOSSIP_TTL, 0 - unlimited)")
+    parser.add_argument('--mode', default='emulation', choices=['ideal', 'emulation'], help="Model to calibrate")
+    parser.add_argument('--fit', nargs='*', default=None, help="Overheads to fit (default: handler_ms channel_setup_ms, ideal: hop_overhead_ms)")
+    parser.add_argument('--propagation', default='sync', help="PROPAGATION_MODE of the deployment (sync or async)")
+    parser.add_argument('--fanout', default='sequential', help="FANOUT_MODE of the deployment (sequential or parallel)")
+    parser.add_argument('--latency_emulation', default='sleep', help="LATENCY_EMULATION of the deployment (sleep or timer)")
+    parser.add_argument('--server_workers', type=int, default=10, help="SERVER_WORKERS of the deployment")
+    parser.add_argument('--forward_workers', type=int, default=4, help="FORWARD_WORKERS of the deployment")
+    parser.add_argument('--sender_workers', type=int, default=32, help="SENDER_WORKERS of the deployment")
+    parser.add_argument('--cold', action='store_true', help="Every message opened its channels (default: only the first)")
+    parser.add_argument('--iterations', type=int, default=20, help="Gauss-Newton iterations at most")
+    parser.add_argument('--per_node', default='', help="Write the per-node live and model times to this CSV file")
+    parser.add_argument('--extrapolate', nargs='*', default=[], help="Topology files to run the calibrated model on")
+    parser.add_argument('--initiator', default='gossip-statefulset-0', help="Initiator of the extrapolation runs")
+    args = parser.parse_args()
+
+    fit_names = args.fit if args.fit is not None else DEFAULT_FIT[args.mode]
+    unknown = [name for name in fit_names if name not in PARAMETERS[args.mode]]
+    if unknown:
+        parser.error(f"{args.mode} has no overhead {', '.join(unknown)}, only {', '.join(PARAMETERS[args.mode])}")
+    settings = {}
+    if args.mode == 'emulation':
+        settings = {'propagation': args.propagation, 'fanout': args.fanout, 'latency_emulation': args.latency_emulation,
+                    'server_workers': args.server_workers, 'forward_workers': args.forward_workers,
+                    'sender_workers': args.sender_workers}
+
+    names, neighbors = load_neighbors(load_topology(args.topology), args.latency_option)
+    live_events = split_messages(load_live_events(args.events))
+    initiated = []
+    for message, events in live_events.items():
+        if args.message and message not in args.message:
+            continue
+        initiator, live = first_receive_times(events)
+        if initiator is None:
+            print(f"{message}: no 'initiate' event, skipped", flush=True)
+        elif initiator not in neighbors:
+            print(f"{message}: initiator {initiator} is not in {args.topology}, skipped", flush=True)
+        else:
+            initiated.append((min(event['received_timestamp'] for event in events if event['event_type'] == 'initiate'),
+                              message, initiator, live))
+    # In the order of the initiations, the first one is the one that opened the channels
+    samples = [(message, initiator, live, args.cold or i == 0)
+               for i, (_, message, initiator, live) in enumerate(sorted(initiated))]
+    if not samples:
+        parser.error("no message with an 'initiate' event in the events")
+
+    model = Model(neighbors, args.mode, args.ttl, settings)
+    calibration = Calibration(model, samples, fit_names)
+    zero = [0.0] * len(fit_names)
+    before = calibration.residuals(zero)
+    values, cost, iterations = calibration.fit(zero, iterations=args.iterations)
+    after = calibration.residuals(values)
+    fitted = calibration.overheads(values)
+    cold_messages = sum(1 for sample in samples if sample[3])
+
+    print(f"{len(names)} nodes, {len(samples)} messages ({cold_messages} opening channels), {args.mode} model, {model.runs} simulations, "
+          f"{iterations} iterations", flush=True)
+    for name in fit_names:
+        print(f"fitted {name}: {fitted[name]:.3f}", flush=True)
+    if calibration.rank < len(fit_names):
+        print(f"{', '.join(fit_names)} cannot be told apart by these messages, only their sum is fitted", flush=True)
+    print("first receive time error (model - live):", flush=True)
+    print_stats('uncalibrated', error_stats(before))
+    print_stats('calibrated', error_stats(after))
+
+    # Per message, the coverage the calibrated model predicts next to the measured one
+    print(f"{'message':<48}{'initiator':<26}{'live 100% ms':>14}{'model 100% ms':>15}", flush=True)
+    for message, initiator, live, cold in samples:
+        live_full = coverage_time(coverage_curve(live, len(names)), 1.0)
+        times = model.first_receive(initiator, calibration.overheads(values, cold))
+        model_full = coverage_time(coverage_curve(times, len(names)), 1.0)
+        cells = ['-' if value is None else f"{value:.1f}" for value in (live_full, model_full)]
+        print(f"{message[:47]:<48}{initiator:<26}{cells[0]:>14}{cells[1]:>15}", flush=True)
+
+    if args.per_node:
+        write_per_node(args.per_node, calibration, live_events, values)
+
+    # A fresh deployment of every topology, the first message opens the channels
+    if args.extrapolate:
+        print(f"{'topology':<48}{'nodes':>7}{'ideal 100% ms':>15}{'calibrated 50%':>16}{'90%':>10}{'100%':>10}",
+              flush=True)
+    for path in args.extrapolate:
+        target_names, target_neighbors = load_neighbors(load_topology(path), args.latency_option)
+        initiator = args.initiator if args.initiator in target_neighbors else target_names[0]
+        ideal = GossipSimulator(target_neighbors, ttl=args.ttl).run(initiator, 'extrapolation', start_ns=0)
+        ideal_full = coverage_time(coverage_curve(first_receive_times(ideal)[1], len(target_names)), 1.0)
+        times = Model(target_neighbors, args.mode, args.ttl, settings).first_receive(initiator, fitted)
+        curve = coverage_curve(times, len(target_names))
+        cells = ['-' if value is None else f"{value:.1f}"
+                 for value in [ideal_full] + [coverage_time(curve, fraction) for fraction in (0.5, 0.9, 1.0)]]
+        print(f"{os.path.basename(path)[:47]:<48}{len(target_names):>7}{cells[0]:>15}{cells[1]:>16}{cells[2]:>10}"
+              f"{cells[3]:>10}", flush=True)
@@ -0,0 +1,241 @@
+import argparse
+import csv
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gossip_sim import GossipSimulator, EmulatedSimulator, load_neighbors, load_topology, summarize
+from topology_index import FILENAME_PATTERN, select_files
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Monte-Carlo campaign of simulated gossip runs (gossip_sim.py) over the topology files.
+#
+# The files are selected like automate.py, with the same --num_test, --cluster,
+# --model and --target_filename, so one campaign definition runs live (automate.py)
+# or simulated here. Every run of a file draws its own initiator (--initiator
+# random) and its own latencies (every edge latency times a uniform factor in
+# 1 +- --jitter, the same in both directions) from a seed derived from --seed,
+# the file and the run, so any run can be reproduced on its own. The runs are
+# spread over --workers processes:
+#
+# python campaign.py --num_test 100 --cluster all --model BA --jitter 0.1 --out campaign.parquet
+#
+# Every run is one row (the gossip_sim summary plus the run parameters). The rows
+# are written as they come in, every --batch rows, to a Parquet (.parquet) or
+# Feather (.feather, .arrow) file, which need pyarrow, or to a CSV file.
+
+COLUMNS = [
+    ('file', 'string'), ('cluster', 'string'), ('model', 'string'), ('nodes', 'int64'),
+    ('run', 'int64'), ('seed', 'int64'), ('mode', 'string'), ('initiator', 'string'), ('jitter', 'float64'),
+    ('reached', 'int64'), ('total_nodes', 'int64'), ('duplicates', 'int64'),
+    ('coverage_50_ms', 'float64'), ('coverage_90_ms', 'float64'), ('coverage_99_ms', 'float64'),
+    ('coverage_100_ms', 'float64'), ('stalled', 'int64'), ('events', 'int64'), ('simulation_steps', 'int64'),
+    ('elapsed_ms', 'float64'),
+]
+
+# Topologies already loaded by this worker process
+_topologies = {}
+
+
+def check_campaign(cluster, model, target_filename):
+    """Error message for a campaign automate.py would refuse to run, None if it is fine."""
+    if cluster not in ('0', '1', 'all'):
+        return f"cluster should be 0, 1 or all, not {cluster}"
+    if target_filename == '':
+        if model not in ('BA', 'ER'):
+            return "model should be BA or ER"
+    elif not model or model not in target_filename:
+        return f"target filename {target_filename} does not have the same model ({model})"
+    return None
+
+
+def run_seed(seed, filename, run):
+    # A str seed is hashed the same way in every process, unlike hash()
+    return random.Random(f"{seed}:{filename}:{run}").getrandbits(32)
+
+
+def jitter_neighbors(topology, latency_option, jitter, rng):
+    """load_neighbors with every edge latency times a factor in [1 - jitter, 1 + jitter]."""
+    scale = (lambda: rng.uniform(1 - jitter, 1 + jitter)) if jitter else None
+    return load_neighbors(topology, latency_option, scale=scale)
+
+
+def simulate(task):
+    """One campaign run (a dict of run parameters), as a row of COLUMNS."""
+    path = task['path']
+    if path not in _topologies:
+        _topologies[path] = load_topology(path)
+    topology = _topologies[path]
+
+    seed = run_seed(task['seed'], os.path.basename(path), task['run'])
+    rng = random.Random(seed)
+    names, neighbors = jitter_neighbors(topology, task['latency_option'], task['jitter'], rng)
+    initiator = rng.choice(names) if task['initiator'] == 'random' else task['initiator']
+
+    start = time.perf_counter()
+    if task['mode'] == 'emulation':
+        simulator = EmulatedSimulator(neighbors, ttl=task['ttl'], **task['emulation'])
+    else:
+        simulator = GossipSimulator(neighbors, hop_overhead_ms=task['hop_overhead_ms'], ttl=task['ttl'])
+    events = simulator.run(initiator, f"{os.path.basename(path)[:-5]}-run{task['run']}", start_ns=0)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    filename = os.path.basename(path)
+    match = FILENAME_PATTERN.match(filename)
+    row = {
+        'file': filename,
+        'cluster': '1' if filename.startswith('kmeans_') else '0',
+        'model': match.group(2) if match else '',
+        'nodes': len(names),
+        'run': task['run'],
+        'seed': seed,
+        'mode': task['mode'],
+        'jitter': task['jitter'],
+    }
+    row.update(summarize(events, len(names)))
+    row.update({
+        'stalled': getattr(simulator, 'stalled', 0),
+        'events': len(events),
+        'simulation_steps': simulator.queue.processed,
+        'elapsed_ms': elapsed_ms,
+    })
+    return row
+
+
+class ResultWriter:
+    """Appends rows to a Parquet, Feather or CSV file, every batch rows at a time."""
+
+    def __init__(self, path, batch=1000):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.parquet', '.feather', '.arrow') and pyarrow is None:
+            path = os.path.splitext(path)[0] + '.csv'
+            extension = '.csv'
+            print(f"pyarrow is not installed, writing {path} instead", flush=True)
+        self.path = path
+        self.batch = batch
+        self.rows = []
+        self.written = 0
+        self._csv_file = None
+        self._writer = None
+
+        if extension == '.csv':
+            self._csv_file = open(path, 'w', newline='')
+            self._writer = csv.DictWriter(self._csv_file, fieldnames=[name for name, _ in COLUMNS])
+            self._writer.writeheader()
+        else:
+            self._schema = pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in COLUMNS])
+            if extension == '.parquet':
+                self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+            else:
+                # Feather v2 is the Arrow IPC file format
+                self._writer = pyarrow.ipc.new_file(path, self._schema)
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self._csv_file:
+            self._writer.writerows({name: row.get(name) for name, _ in COLUMNS} for row in self.rows)
+            self._csv_file.flush()
+        else:
+            table = pyarrow.Table.from_pylist(self.rows, schema=self._schema)
+            self._writer.write_table(table)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self._csv_file:
+            self._csv_file.close()
+        else:
+            self._writer.close()
+
+
+def campaign_tasks(files, args):
+    """Parameters of every run, num_test runs of every file."""
+    emulation = {
+        'propagation': args.propagation, 'fanout': args.fanout, 'latency_emulation': args.latency_emulation,
+        'server_workers': args.server_workers, 'forward_workers': args.forward_workers,
+        'sender_workers': args.sender_workers, 'handler_ms': args.handler_ms, 'rpc_ms': args.rpc_ms,
+        'channel_setup_ms': args.channel_setup_ms,
+    }
+    # Runs of the same file next to each other, a worker then loads each file once per chunk
+    return [{'path': path, 'run': run, 'seed': args.seed, 'initiator': args.initiator, 'jitter': args.jitter,
+             'latency_option': args.latency_option, 'mode': args.mode, 'ttl': args.ttl,
+             'hop_overhead_ms': args.hop_overhead_ms, 'emulation': emulation}
+            for path in files for run in range(1, args.num_test + 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python campaign.py --num_test <runs per file> --cluster <0|1|all> --model <model> [--out campaign.parquet]")
+    parser.add_argument('--num_test', required=True, type=int, help="Simulated runs per topology file")
+    parser.add_argument('--cluster', required=True, help="0 - topology, 1 - topology_kmeans, all - both")
+    parser.add_argument('--model', default='', help="Network model (BA or ER)")
+    parser.add_argument('--target_filename', default='', help="Specific filename to be tested, empty - every file of the model")
+    parser.add_argument('--initiator', default='random', help="random, or the node that initiates every run (automate.py: gossip-statefulset-0)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Edge latencies are scaled by a uniform factor in 1 +- jitter per run")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the campaign, the run seeds are derived from it")
+    parser.add_argument('--latency_option', default='weight', help="Edge attribute used as latency (LATENCY_OPTION)")
+    parser.add_argument('--ttl', type=int, default=0, help="Maximum hops (GOSSIP_TTL, 0 - unlimited)")
+    parser.add_argument('--mode', default='ideal', choices=['ideal', 'emulation'], help="Ideal protocol or the node as implemented")
+    parser.add_argument('--hop_overhead_ms', type=float, default=0.0, help="Handling time of a node before it forwards (ideal)")
+    parser.add_argument('--propagation', default='sync', help="PROPAGATION_MODE of the emulation (sync or async)")
+    parser.add_argument('--fanout', default='sequential', help="FANOUT_MODE of the emulation (sequential or parallel)")
+    parser.add_argument('--latency_emulation', default='sleep', help="LATENCY_EMULATION of the emulation (sleep or timer)")
+    parser.add_argument('--server_workers', type=int, default=10, help="SERVER_WORKERS of the emulation")
+    parser.add_argument('--forward_workers', type=int, default=4, help="FORWARD_WORKERS of the emulation")
+    parser.add_argument('--sender_workers', type=int, default=32, help="SENDER_WORKERS of the emulation")
+    parser.add_argument('--handler_ms', type=float, default=0.0, help="Work of every handler call (emulation)")
+    parser.add_argument('--rpc_ms', type=float, default=0.0, help="Overhead of every call (emulation)")
+    parser.add_argument('--channel_setup_ms', type=float, default=0.0, help="Extra cost of the first call of an edge (emulation)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes running the simulations")
+    parser.add_argument('--out', default='campaign.parquet', help="Result file, .parquet, .feather/.arrow or .csv")
+    parser.add_argument('--batch', type=int, default=1000, help="Rows per write (Parquet row group)")
+    args = parser.parse_args()
+
+    error = check_campaign(args.cluster, args.model, args.target_filename)
+    if error:
+        print(f"Sorry, {error}, args={args}", flush=True)
+        sys.exit(1)
+    files = select_files(args.cluster, args.model, args.target_filename)
+    if not files:
+        print(f"No file was found for args={args}", flush=True)
+        sys.exit(1)
+
+    tasks = campaign_tasks(files, args)
+    print(f"{len(files)} files x {args.num_test} runs = {len(tasks)} runs on {args.workers} processes", flush=True)
+    writer = ResultWriter(args.out, args.batch)
+    coverage = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunksize = max(1, min(args.num_test, len(tasks) // (4 * args.workers)))
+        for i, row in enumerate(pool.map(simulate, tasks, chunksize=chunksize), start=1):
+            writer.add(row)
+            coverage.setdefault(row['file'], []).append(row['coverage_100_ms'])
+            if i % max(1, len(tasks) // 10) == 0:
+                print(f"{i}/{len(tasks)} runs, {time.perf_counter() - start:.1f} s", flush=True)
+    writer.close()
+    print(f"{writer.written} rows written to {writer.path} in {time.perf_counter() - start:.1f} s", flush=True)
+
+    # Time to full coverage over the runs of every file, None - the run never reached every node
+    print(f"{'file':<48}{'runs':>6}{'full':>6}{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}", flush=True)
+    for filename, values in coverage.items():
+        full = sorted(value for value in values if value is not None)
+        if full:
+            p90 = full[min(len(full) - 1, int(0.9 * len(full)))]
+            print(f"{filename:<48}{len(values):>6}{len(full):>6}{statistics.median(full):>10.1f}{p90:>10.1f}"
+                  f"{full[-1]:>10.1f}", flush=True)
+        else:
+            print(f"{filename:<48}{len(values):>6}{0:>6}{'-':>10}{'-':>10}{'-':>10}", flush=True)
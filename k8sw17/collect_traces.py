@@ -0,0 +1,107 @@
+import argparse
+import json
+from collections import defaultdict
+import grpc
+import gossip_pb2
+import gossip_pb2_grpc
+
+# Collects the timing spans of the sampled messages (TRACE_SAMPLE_RATE > 0) from
+# every node and reassembles them into cross-node traces. Run it in one of the
+# pods, e.g.
+#   kubectl exec -it gossip-statefulset-0 -- python collect_traces.py --out traces.jsonl
+# or from outside the cluster with --targets <ip:port> ... (through port-forwards)
+
+
+def get_pod_targets(namespace="default", label_selector="app=bcgossip"):
+    """host:port of every gossip pod, from the Kubernetes API."""
+    from kubernetes import client, config
+    config.load_incluster_config()
+    v1 = client.CoreV1Api()
+    pods = v1.list_namespaced_pod(namespace=namespace, label_selector=label_selector)
+    return [f"{pod.status.pod_ip}:5050" for pod in pods.items if pod.status.pod_ip]
+
+
+def collect(targets, clear=False):
+    """The spans of all targets as dicts (same fields as tracing.Tracer spans)."""
+    spans = []
+    for target in targets:
+        with grpc.insecure_channel(target) as channel:
+            stub = gossip_pb2_grpc.GossipServiceStub(channel)
+            try:
+                dump = stub.GetTraces(gossip_pb2.TraceRequest(clear=clear), timeout=10)
+            except grpc.RpcError as e:
+                print(f"Failed to get the traces of {target}: {e}", flush=True)
+                continue
+        for span in dump.spans:
+            spans.append({
+                'trace_id': span.trace_id,
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'node': span.node,
+                'name': span.name,
+                'start_ns': span.start_ns,
+                'duration_ns': span.duration_ns,
+                'attributes': dict(span.attributes),
+            })
+    return spans
+
+
+def summarize(spans):
+    """Count, mean, p50 and p99 (ms) of every stage."""
+    durations = defaultdict(list)
+    for span in spans:
+        durations[span['name']].append(span['duration_ns'] / 1e6)
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            'count': len(values),
+            'mean_ms': sum(values) / len(values),
+            'p50_ms': values[len(values) // 2],
+            'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))],
+        }
+    return summary
+
+
+def print_trace(spans, trace_id):
+    """Prints one trace as a tree, the receive span of a node under the rpc span of its sender."""
+    spans = sorted((span for span in spans if span['trace_id'] == trace_id), key=lambda span: span['start_ns'])
+    if not spans:
+        print(f"No spans of trace {trace_id}", flush=True)
+        return
+    children = defaultdict(list)
+    ids = {span['span_id'] for span in spans}
+    for span in spans:
+        children[span['parent_id'] if span['parent_id'] in ids else None].append(span)
+    start = spans[0]['start_ns']
+
+    def walk(parent_id, depth):
+        for span in children[parent_id]:
+            attributes = " ".join(f"{key}={value}" for key, value in span['attributes'].items())
+            print(f"{(span['start_ns'] - start) / 1e6:>10.3f} ms {'  ' * depth}{span['node']} {span['name']} "
+                  f"{span['duration_ns'] / 1e6:.3f} ms {attributes}", flush=True)
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python collect_traces.py --out <jsonl> [--trace <id>]")
+    parser.add_argument('--targets', nargs='*', help="host:port of the nodes (default: all gossip pods)")
+    parser.add_argument('--out', default='', help="Write the spans to this JSON lines file")
+    parser.add_argument('--trace', default='', help="Print this trace as a tree")
+    parser.add_argument('--clear', action='store_true', help="Empty the span buffers of the nodes")
+    args = parser.parse_args()
+
+    spans = collect(args.targets or get_pod_targets(), clear=args.clear)
+    print(f"{len(spans)} spans of {len({span['trace_id'] for span in spans})} traces", flush=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            for span in spans:
+                f.write(json.dumps(span) + "\n")
+    print(f"{'stage':<10}{'count':>8}{'mean (ms)':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}", flush=True)
+    for name, stage in sorted(summarize(spans).items()):
+        print(f"{name:<10}{stage['count']:>8}{stage['mean_ms']:>12.3f}{stage['p50_ms']:>12.3f}"
+              f"{stage['p99_ms']:>12.3f}", flush=True)
+    if args.trace:
+        print_trace(spans, args.trace)
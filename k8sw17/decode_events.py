@@ -0,0 +1,82 @@
+import argparse
+import glob
+import os
+import struct
+import gossip_pb2
+
+# Decoder of the binary event logs (LOG_SINK=binary, see event_logger.BinaryFileSink).
+# Harvest the files from the pods first, e.g.
+#   kubectl cp gossip-statefulset-0:/app/events ./events/gossip-statefulset-0
+# then
+#   python decode_events.py ./events --out events.csv
+
+COLUMNS = ['message', 'sender_id', 'receiver_id', 'received_timestamp',
+           'propagation_time', 'latency_ms', 'event_type', 'hop_count']
+
+
+def iter_events(path):
+    """Yields the events of one .bin file as dicts (same fields as the JSON events, without 'detail')."""
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                return
+            (length,) = struct.unpack('<I', header)
+            record = f.read(length)
+            if len(record) < length:
+                # Last record of a file that was still being written
+                return
+            event = gossip_pb2.GossipEvent.FromString(record)
+            yield {
+                'message': event.message,
+                'sender_id': event.sender_id,
+                'receiver_id': event.receiver_id,
+                'received_timestamp': event.received_timestamp,
+                'propagation_time': event.propagation_time if event.HasField('propagation_time') else None,
+                'latency_ms': event.latency_ms if event.HasField('latency_ms') else None,
+                'event_type': event.event_type,
+                'hop_count': event.hop_count if event.HasField('hop_count') else None,
+            }
+
+
+def find_files(paths):
+    """The .bin files of the given files and directories (searched recursively), in name order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '**', '*.bin'), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def load_events(paths, chunk_size=100000):
+    """Streams the events of all files into one pandas DataFrame, chunk_size rows at a time."""
+    import pandas as pd
+
+    frames = []
+    rows = []
+    for path in find_files(paths):
+        for event in iter_events(path):
+            rows.append(event)
+            if len(rows) >= chunk_size:
+                frames.append(pd.DataFrame(rows, columns=COLUMNS))
+                rows = []
+    if rows or not frames:
+        frames.append(pd.DataFrame(rows, columns=COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python decode_events.py <files or folders> --out <csv>")
+    parser.add_argument('paths', nargs='+', help=".bin files or folders with .bin files")
+    parser.add_argument('--out', default='', help="Write the events to this CSV file (default: print a summary)")
+    args = parser.parse_args()
+
+    df = load_events(args.paths)
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"{len(df)} events written to {args.out}", flush=True)
+    else:
+        print(df.groupby('event_type').size(), flush=True)
+        print(df.head(), flush=True)
@@ -0,0 +1,166 @@
+import hashlib
+import multiprocessing
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+DIGEST_SIZE = 32
+
+
+def message_digest(message):
+    """Fixed-size (32 bytes) digest of a message, used as the dedup key instead of the message itself."""
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    return hashlib.sha256(message).digest()
+
+
+class DedupCache:
+    """
+    Bounded, expiring store of the messages a node has already seen.
+
+    Messages are keyed by their SHA-256 digest, so every entry has the same size
+    whatever the payload. Entries are kept in insertion order: the oldest ones are
+    evicted once there are more than `capacity` of them, or once they are older
+    than `ttl` seconds (ttl=0 disables expiry).
+    """
+
+    def __init__(self, capacity=100000, ttl=3600):
+        self.capacity = capacity
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> insertion time
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def check_and_add(self, message):
+        """Returns True if the message was seen before, otherwise records it and returns False."""
+        return self.check_and_add_digest(message_digest(message))
+
+    def check_and_add_digest(self, digest):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if digest in self._entries:
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            self._entries[digest] = now
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return False
+
+    def __contains__(self, message):
+        digest = message_digest(message)
+        with self._lock:
+            self._expire(time.monotonic())
+            return digest in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {'dedup_size': len(self._entries), 'dedup_hits': self.hits, 'dedup_misses': self.misses,
+                    'dedup_evictions': self.evictions, 'dedup_expirations': self.expirations}
+
+    def _expire(self, now):
+        if not self.ttl:
+            return
+        while self._entries:
+            digest, inserted = next(iter(self._entries.items()))
+            if now - inserted < self.ttl:
+                break
+            self._entries.popitem(last=False)
+            self.expirations += 1
+
+
+class SharedDedupTable:
+    """
+    Dedup table in shared memory, consistent across the worker processes of a node.
+
+    Same interface as DedupCache. It must be created before the workers are forked,
+    they then all see the same table. The table is set-associative: a digest maps
+    to one bucket of `ways` slots (32-byte digest + 8-byte insertion time each),
+    a new digest takes an empty or expired slot of its bucket, or evicts the oldest
+    one. Every bucket is guarded by one of `num_locks` striped locks, so workers
+    only contend on the same bucket. The counters are per process.
+    """
+
+    SLOT_SIZE = DIGEST_SIZE + 8
+
+    def __init__(self, capacity=100000, ttl=3600, ways=8, num_locks=64, context=None):
+        context = context or multiprocessing.get_context('fork')
+        self.ttl = ttl
+        self.ways = ways
+        self.num_buckets = max(1, -(-capacity * 2 // ways))  # half full at capacity
+        self.capacity = self.num_buckets * ways
+
+        self._buffer = context.RawArray('B', self.capacity * self.SLOT_SIZE)
+        self._view = memoryview(self._buffer).cast('B')
+        self._locks = [context.Lock() for _ in range(num_locks)]
+        self._empty = bytes(DIGEST_SIZE)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def check_and_add(self, message):
+        """Returns True if the message was seen before, otherwise records it and returns False."""
+        return self.check_and_add_digest(message_digest(message))
+
+    def check_and_add_digest(self, digest):
+        bucket = int.from_bytes(digest[:8], 'little') % self.num_buckets
+        start = bucket * self.ways * self.SLOT_SIZE
+        now = time.time()
+        with self._locks[bucket % len(self._locks)]:
+            free = None
+            oldest = None
+            oldest_time = None
+            for way in range(self.ways):
+                offset = start + way * self.SLOT_SIZE
+                slot_digest = self._view[offset:offset + DIGEST_SIZE]
+                if slot_digest == self._empty:
+                    free = offset if free is None else free
+                    continue
+                (inserted,) = struct.unpack_from('<d', self._view, offset + DIGEST_SIZE)
+                expired = self.ttl and now - inserted >= self.ttl
+                if slot_digest == digest and not expired:
+                    self.hits += 1
+                    return True
+                if expired and free is None:
+                    free = offset
+                    self.expirations += 1
+                elif oldest_time is None or inserted < oldest_time:
+                    oldest, oldest_time = offset, inserted
+
+            self.misses += 1
+            if free is None:
+                free = oldest
+                self.evictions += 1
+            self._view[free:free + DIGEST_SIZE] = digest
+            struct.pack_into('<d', self._view, free + DIGEST_SIZE, now)
+            return False
+
+    def __contains__(self, message):
+        digest = message_digest(message)
+        bucket = int.from_bytes(digest[:8], 'little') % self.num_buckets
+        start = bucket * self.ways * self.SLOT_SIZE
+        now = time.time()
+        with self._locks[bucket % len(self._locks)]:
+            for way in range(self.ways):
+                offset = start + way * self.SLOT_SIZE
+                if self._view[offset:offset + DIGEST_SIZE] == digest:
+                    (inserted,) = struct.unpack_from('<d', self._view, offset + DIGEST_SIZE)
+                    return not (self.ttl and now - inserted >= self.ttl)
+        return False
+
+    def stats(self):
+        return {'dedup_slots': self.capacity, 'dedup_hits': self.hits, 'dedup_misses': self.misses,
+                'dedup_evictions': self.evictions, 'dedup_expirations': self.expirations}
@@ -0,0 +1,196 @@
+import atexit
+import json
+import os
+import struct
+import sys
+import threading
+from collections import deque
+import gossip_pb2
+
+# orjson is optional, it is several times faster than json for the event dicts
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(event):
+    """One event as a JSON line (bytes), same fields and order as the event dict."""
+    if orjson is not None:
+        return orjson.dumps(event) + b"\n"
+    return (json.dumps(event) + "\n").encode('utf-8')
+
+
+class JsonLineSink:
+    """Writes events as JSON lines to stdout (picked up by Cloud Logging / BigQuery)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout.buffer
+
+    def write(self, events):
+        self.stream.write(b"".join(encode_json(event) for event in events))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class BinaryFileSink:
+    """
+    Writes events as length-prefixed GossipEvent protobuf records to local files.
+
+    Every record is a 4-byte little-endian length followed by the serialized
+    GossipEvent (the 'detail' text is left out). Files are named
+    <prefix>-00000.bin, <prefix>-00001.bin, ... and a new one is started once the
+    current file reaches max_bytes. Only the last max_files files are kept
+    (0 - keep all). decode_events.py reads them back.
+    """
+
+    FIELDS = ('message', 'sender_id', 'receiver_id', 'received_timestamp',
+              'propagation_time', 'latency_ms', 'event_type', 'hop_count')
+
+    def __init__(self, directory, prefix, max_bytes=64 * 1024 * 1024, max_files=0):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+
+        os.makedirs(directory, exist_ok=True)
+        self._index = 0
+        while os.path.exists(self._path(self._index)):
+            self._index += 1
+        self._file = open(self._path(self._index), 'ab')
+
+    def write(self, events):
+        records = []
+        for event in events:
+            record = gossip_pb2.GossipEvent(**{field: event[field] for field in self.FIELDS
+                                              if event.get(field) is not None}).SerializeToString()
+            records.append(struct.pack('<I', len(record)))
+            records.append(record)
+        self._file.write(b"".join(records))
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        self._file.close()
+
+    def _path(self, index):
+        return os.path.join(self.directory, f"{self.prefix}-{index:05d}.bin")
+
+    def _rotate(self):
+        self._file.close()
+        self._index += 1
+        self._file = open(self._path(self._index), 'ab')
+        if self.max_files and self._index >= self.max_files:
+            old = self._path(self._index - self.max_files)
+            if os.path.exists(old):
+                os.remove(old)
+
+
+def create_sink(kind, receiver_id, directory="events", max_bytes=64 * 1024 * 1024, max_files=0):
+    """The event sink selected by LOG_SINK: 'json' (stdout) or 'binary' (local files)."""
+    if kind == 'binary':
+        return BinaryFileSink(directory, f"events-{receiver_id}", max_bytes=max_bytes, max_files=max_files)
+    return JsonLineSink()
+
+
+class EventLogger:
+    """
+    Asynchronous, batched writer of the gossip events.
+
+    log() only counts the event, appends the event dict to a deque (no I/O) and returns.
+    A background writer thread takes the queued events in batches and hands them
+    to the sink, once batch_size events are waiting or every flush_interval
+    seconds. The queue is bounded by max_queue, when it is full the newest event
+    is dropped ('drop_newest') or the oldest one ('drop_oldest'), and dropped
+    events are counted. close() (also registered with atexit) writes what is left.
+
+    With asynchronous=False every event is written by the caller right away.
+    """
+
+    def __init__(self, sink=None, asynchronous=True, batch_size=256, flush_interval=0.5,
+                 max_queue=100000, drop_policy='drop_newest'):
+        self.sink = sink if sink is not None else JsonLineSink()
+        self.asynchronous = asynchronous
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+
+        self._queue = deque(maxlen=max_queue if drop_policy == 'drop_oldest' else None)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+
+        self._write_lock = threading.Lock()
+        # log() runs on every handler thread, the counters are updated under their own
+        # lock (held only for the increment, never during the I/O of _write_lock)
+        self._count_lock = threading.Lock()
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(target=self._run, name="event-logger", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def log(self, event):
+        with self._count_lock:
+            self.logged += 1
+        if not self.asynchronous:
+            self._write([event])
+            return
+
+        queued = len(self._queue)
+        if queued >= self.max_queue:
+            with self._count_lock:
+                self.dropped += 1
+            if self.drop_policy == 'drop_newest':
+                return
+        self._queue.append(event)
+        if queued + 1 >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes every queued event now."""
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.popleft())
+            except IndexError:
+                pass
+            if batch:
+                self._write(batch)
+            if len(batch) < self.batch_size:
+                return
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._wakeup.set()
+            self._thread.join(timeout=5)
+        self.flush()
+        self.sink.close()
+
+    def stats(self):
+        return {'events_logged': self.logged, 'events_written': self.written,
+                'events_dropped': self.dropped, 'events_queued': len(self._queue)}
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _write(self, batch):
+        with self._write_lock:
+            try:
+                self.sink.write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                print(f"Failed to write {len(batch)} events: {e}", file=sys.stderr, flush=True)
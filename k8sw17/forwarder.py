@@ -0,0 +1,119 @@
+import queue
+import threading
+import time
+from concurrent import futures
+
+
+class ForwardingEngine:
+    """
+    Per-node forwarding engine for the asynchronous propagation mode.
+
+    SendMessage only records the message and hands it over to this engine,
+    so the RPC can be acknowledged straight away. The forwarding work
+    (gossip_message) is done by a small set of dedicated worker threads
+    instead of the gRPC server pool. When the forwards of a message are done,
+    on_complete(message, sender_id, elapsed_ms) is called so the node can
+    report it, and wait_until_drained() can be used to wait for all of them.
+
+    With an executor the messages are forwarded on it instead of the engine's
+    own workers, so many engines (the nodes of a virtual cluster) can share one
+    pool of threads.
+    """
+
+    def __init__(self, forward_fn, on_complete=None, num_workers=1, executor=None):
+        self.forward_fn = forward_fn
+        self.on_complete = on_complete
+        self.num_workers = num_workers
+        self.executor = executor
+
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._drained = threading.Condition()
+        self._workers = []
+
+    def start(self):
+        if self.executor is not None:
+            return
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._run, name=f"forwarder-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, message, sender_id, *args):
+        """Queue a message to be forwarded to the neighbors. Returns immediately."""
+        with self._drained:
+            self._pending += 1
+        item = (message, sender_id, args, time.time_ns())
+        if self.executor is not None:
+            self.executor.submit(self._forward, item)
+        else:
+            self._queue.put(item)
+
+    def pending(self):
+        """Number of messages queued or still being forwarded."""
+        with self._drained:
+            return self._pending
+
+    def wait_until_drained(self, timeout=None):
+        """Blocks until every submitted message has been forwarded. Returns False on timeout."""
+        with self._drained:
+            return self._drained.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def stop(self, timeout=None):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._forward(item)
+
+    def _forward(self, item):
+        message, sender_id, args, queued_timestamp = item
+        try:
+            self.forward_fn(message, sender_id, *args)
+        except Exception as e:
+            print(f"Failed to forward message from {sender_id}: {e}", flush=True)
+        finally:
+            elapsed_ms = (time.time_ns() - queued_timestamp) / 1e6
+            if self.on_complete:
+                self.on_complete(message, sender_id, elapsed_ms)
+            with self._drained:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._drained.notify_all()
+
+
+class FanOutEngine:
+    """
+    Parallel fan-out: sends one message to all of its target neighbors at once.
+
+    Every target is handed to send_fn(message, neighbor, latency, *args) on a dedicated
+    sender pool, so the emulated latency of an edge only delays its own link
+    instead of every neighbor that comes after it. A pool can be given to share
+    one sender pool between many engines.
+    """
+
+    def __init__(self, send_fn, max_workers=32, pool=None):
+        self.send_fn = send_fn
+        self._own_pool = pool is None
+        self.pool = pool or futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sender")
+
+    def send_all(self, message, targets, *args):
+        """Starts sending to every (neighbor, latency) in targets. Returns one future per target."""
+        return [self.pool.submit(self.send_fn, message, neighbor, latency, *args) for neighbor, latency in targets]
+
+    def broadcast(self, message, targets, *args, timeout=None):
+        """Sends to every target and waits until all of them are done (or timeout)."""
+        sends = self.send_all(message, targets, *args)
+        futures.wait(sends, timeout=timeout)
+        return sends
+
+    def shutdown(self):
+        if self._own_pool:
+            self.pool.shutdown(wait=False)
@@ -14,17 +14,39 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0cgossip.proto\x12\x06gossip\"Z\n\rGossipMessage\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x11\n\tsender_id\x18\x02 \x01(\t\x12\x11\n\ttimestamp\x18\x03 \x01(\x03\x12\x12\n\nlatency_ms\x18\x04 \x01(\x02\"!\n\x0e\x41\x63knowledgment\x12\x0f\n\x07\x64\x65tails\x18\x01 \x01(\t2M\n\rGossipService\x12<\n\x0bSendMessage\x12\x15.gossip.GossipMessage\x1a\x16.gossip.Acknowledgmentb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0cgossip.proto\x12\x06gossip\"\xdd\x01\n\rGossipMessage\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x11\n\tsender_id\x18\x02 \x01(\t\x12\x11\n\ttimestamp\x18\x03 \x01(\x03\x12\x12\n\nlatency_ms\x18\x04 \x01(\x02\x12\x0f\n\x07version\x18\x05 \x01(\r\x12\x12\n\nmessage_id\x18\x06 \x01(\x0c\x12\x11\n\torigin_id\x18\x07 \x01(\t\x12\x18\n\x10origin_timestamp\x18\x08 \x01(\x03\x12\x11\n\thop_count\x18\t \x01(\r\x12\x0b\n\x03ttl\x18\n \x01(\r\x12\x0f\n\x07payload\x18\x0b \x01(\x0c\"6\n\x0bGossipBatch\x12\'\n\x08messages\x18\x01 \x03(\x0b\x32\x15.gossip.GossipMessage\"!\n\x0e\x41\x63knowledgment\x12\x0f\n\x07\x64\x65tails\x18\x01 \x01(\t\"\x0e\n\x0cStatsRequest\"o\n\x05Stats\x12)\n\x06values\x18\x01 \x03(\x0b\x32\x19.gossip.Stats.ValuesEntry\x12\x0c\n\x04text\x18\x02 \x01(\t\x1a-\n\x0bValuesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01:\x02\x38\x01\"\xe4\x01\n\x04Span\x12\x10\n\x08trace_id\x18\x01 \x01(\t\x12\x0f\n\x07span_id\x18\x02 \x01(\t\x12\x11\n\tparent_id\x18\x03 \x01(\t\x12\x0c\n\x04node\x18\x04 \x01(\t\x12\x0c\n\x04name\x18\x05 \x01(\t\x12\x10\n\x08start_ns\x18\x06 \x01(\x03\x12\x13\n\x0b\x64uration_ns\x18\x07 \x01(\x03\x12\x30\n\nattributes\x18\x08 \x03(\x0b\x32\x1c.gossip.Span.AttributesEntry\x1a\x31\n\x0f\x41ttributesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"\x1d\n\x0cTraceRequest\x12\r\n\x05\x63lear\x18\x01 \x01(\x08\"(\n\tTraceDump\x12\x1b\n\x05spans\x18\x01 \x03(\x0b\x32\x0c.gossip.Span\"\xf8\x01\n\x0bGossipEvent\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x11\n\tsender_id\x18\x02 \x01(\t\x12\x13\n\x0breceiver_id\x18\x03 \x01(\t\x12\x1a\n\x12received_timestamp\x18\x04 \x01(\x03\x12\x1d\n\x10propagation_time\x18\x05 \x01(\x01H\x00\x88\x01\x01\x12\x17\n\nlatency_ms\x18\x06 \x01(\x02H\x01\x88\x01\x01\x12\x12\n\nevent_type\x18\x07 \x01(\t\x12\x16\n\thop_count\x18\x08 \x01(\rH\x02\x88\x01\x01\x42\x13\n\x11_propagation_timeB\r\n\x0b_latency_msB\x0c\n\n_hop_count2\xb1\x02\n\rGossipService\x12<\n\x0bSendMessage\x12\x15.gossip.GossipMessage\x1a\x16.gossip.Acknowledgment\x12\x41\n\x0cGossipStream\x12\x15.gossip.GossipMessage\x1a\x16.gossip.Acknowledgment(\x01\x30\x01\x12\x38\n\tSendBatch\x12\x13.gossip.GossipBatch\x1a\x16.gossip.Acknowledgment\x12/\n\x08GetStats\x12\x14.gossip.StatsRequest\x1a\r.gossip.Stats\x12\x34\n\tGetTraces\x12\x14.gossip.TraceRequest\x1a\x11.gossip.TraceDumpb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'gossip_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
-  _globals['_GOSSIPMESSAGE']._serialized_start=24
-  _globals['_GOSSIPMESSAGE']._serialized_end=114
-  _globals['_ACKNOWLEDGMENT']._serialized_start=116
-  _globals['_ACKNOWLEDGMENT']._serialized_end=149
-  _globals['_GOSSIPSERVICE']._serialized_start=151
-  _globals['_GOSSIPSERVICE']._serialized_end=228
+  _globals['_STATS_VALUESENTRY']._options = None
+  _globals['_STATS_VALUESENTRY']._serialized_options = b'8\001'
+  _globals['_SPAN_ATTRIBUTESENTRY']._options = None
+  _globals['_SPAN_ATTRIBUTESENTRY']._serialized_options = b'8\001'
+  _globals['_GOSSIPMESSAGE']._serialized_start=25
+  _globals['_GOSSIPMESSAGE']._serialized_end=246
+  _globals['_GOSSIPBATCH']._serialized_start=248
+  _globals['_GOSSIPBATCH']._serialized_end=302
+  _globals['_ACKNOWLEDGMENT']._serialized_start=304
+  _globals['_ACKNOWLEDGMENT']._serialized_end=337
+  _globals['_STATSREQUEST']._serialized_start=339
+  _globals['_STATSREQUEST']._serialized_end=353
+  _globals['_STATS']._serialized_start=355
+  _globals['_STATS']._serialized_end=466
+  _globals['_STATS_VALUESENTRY']._serialized_start=421
+  _globals['_STATS_VALUESENTRY']._serialized_end=466
+  _globals['_SPAN']._serialized_start=469
+  _globals['_SPAN']._serialized_end=697
+  _globals['_SPAN_ATTRIBUTESENTRY']._serialized_start=648
+  _globals['_SPAN_ATTRIBUTESENTRY']._serialized_end=697
+  _globals['_TRACEREQUEST']._serialized_start=699
+  _globals['_TRACEREQUEST']._serialized_end=728
+  _globals['_TRACEDUMP']._serialized_start=730
+  _globals['_TRACEDUMP']._serialized_end=770
+  _globals['_GOSSIPEVENT']._serialized_start=773
+  _globals['_GOSSIPEVENT']._serialized_end=1021
+  _globals['_GOSSIPSERVICE']._serialized_start=1024
+  _globals['_GOSSIPSERVICE']._serialized_end=1329
 # @@protoc_insertion_point(module_scope)
@@ -19,6 +19,26 @@ class GossipServiceStub(object):
                 request_serializer=gossip__pb2.GossipMessage.SerializeToString,
                 response_deserializer=gossip__pb2.Acknowledgment.FromString,
                 )
+        self.GossipStream = channel.stream_stream(
+                '/gossip.GossipService/GossipStream',
+                request_serializer=gossip__pb2.GossipMessage.SerializeToString,
+                response_deserializer=gossip__pb2.Acknowledgment.FromString,
+                )
+        self.SendBatch = channel.unary_unary(
+                '/gossip.GossipService/SendBatch',
+                request_serializer=gossip__pb2.GossipBatch.SerializeToString,
+                response_deserializer=gossip__pb2.Acknowledgment.FromString,
+                )
+        self.GetStats = channel.unary_unary(
+                '/gossip.GossipService/GetStats',
+                request_serializer=gossip__pb2.StatsRequest.SerializeToString,
+                response_deserializer=gossip__pb2.Stats.FromString,
+                )
+        self.GetTraces = channel.unary_unary(
+                '/gossip.GossipService/GetTraces',
+                request_serializer=gossip__pb2.TraceRequest.SerializeToString,
+                response_deserializer=gossip__pb2.TraceDump.FromString,
+                )
 
 
 class GossipServiceServicer(object):
@@ -30,6 +50,33 @@ class GossipServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GossipStream(self, request_iterator, context):
+        """Long-lived stream between two neighbors, one Acknowledgment per GossipMessage (in order)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SendBatch(self, request, context):
+        """Coalesced messages, one Acknowledgment for the whole batch
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetStats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetTraces(self, request, context):
+        """Spans of the sampled messages still in the node's ring buffer
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_GossipServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +85,26 @@ def add_GossipServiceServicer_to_server(servicer, server):
                     request_deserializer=gossip__pb2.GossipMessage.FromString,
                     response_serializer=gossip__pb2.Acknowledgment.SerializeToString,
             ),
+            'GossipStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.GossipStream,
+                    request_deserializer=gossip__pb2.GossipMessage.FromString,
+                    response_serializer=gossip__pb2.Acknowledgment.SerializeToString,
+            ),
+            'SendBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.SendBatch,
+                    request_deserializer=gossip__pb2.GossipBatch.FromString,
+                    response_serializer=gossip__pb2.Acknowledgment.SerializeToString,
+            ),
+            'GetStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetStats,
+                    request_deserializer=gossip__pb2.StatsRequest.FromString,
+                    response_serializer=gossip__pb2.Stats.SerializeToString,
+            ),
+            'GetTraces': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetTraces,
+                    request_deserializer=gossip__pb2.TraceRequest.FromString,
+                    response_serializer=gossip__pb2.TraceDump.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'gossip.GossipService', rpc_method_handlers)
@@ -64,3 +131,71 @@ class GossipService(object):
             gossip__pb2.Acknowledgment.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GossipStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/gossip.GossipService/GossipStream',
+            gossip__pb2.GossipMessage.SerializeToString,
+            gossip__pb2.Acknowledgment.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def SendBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/gossip.GossipService/SendBatch',
+            gossip__pb2.GossipBatch.SerializeToString,
+            gossip__pb2.Acknowledgment.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/gossip.GossipService/GetStats',
+            gossip__pb2.StatsRequest.SerializeToString,
+            gossip__pb2.Stats.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetTraces(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/gossip.GossipService/GetTraces',
+            gossip__pb2.TraceRequest.SerializeToString,
+            gossip__pb2.TraceDump.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
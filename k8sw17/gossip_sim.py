@@ -0,0 +1,484 @@
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+
+# Discrete-event simulator of the gossip propagation over the topology files
+# (topology/*.json, topology_kmeans/*.json), without any cluster.
+#
+# The simulated nodes follow the forwarding rules of Node: a new message is logged
+# as 'received' and forwarded to every neighbor except its sender, a message seen
+# before is logged as 'duplicate' and dropped, and every send arrives after the
+# latency (LATENCY_OPTION, 'weight') of its edge. The events are dicts with the
+# fields of the live logs (Node._log_event), so the same analysis (first receive
+# times, duplicates, coverage) runs on both, e.g.
+#
+# python gossip_sim.py --topology topology/nodes300_Feb092025140642_BA2.json --out sim_events.jsonl
+#
+# --mode ideal: every new message is forwarded to all neighbors at once
+# (PROPAGATION_MODE=async, FANOUT_MODE=parallel), after hop_overhead_ms of handling
+# time on the node, the lower bound the protocol allows.
+# --mode emulation: the node as it is implemented (EmulatedSimulator), e.g. the
+# default sync/sequential/sleep node with 10 server workers, next to the ideal run:
+#
+# python gossip_sim.py --topology topology/nodes300_Feb092025140642_BA2.json --mode emulation --rpc_ms 1
+
+
+def load_topology(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_neighbors(topology, latency_option='weight', scale=None):
+    """
+    Node ids and (neighbor, latency) of every node, in the order of Node._find_neighbors.
+    scale (optional) is called once per edge, in the order of the edges, and returns
+    the factor of its latency (the same in both directions).
+    """
+    names = [node['id'] for node in topology['nodes']]
+    neighbors = {name: [] for name in names}
+    for edge in topology['edges']:
+        latency = edge[latency_option]
+        if scale is not None:
+            latency = latency * scale()
+        neighbors[edge['source']].append((edge['target'], latency))
+        neighbors[edge['target']].append((edge['source'], latency))
+    return names, neighbors
+
+
+class EventQueue:
+    """Simulation clock (ms) and the heap of callbacks due at a later time."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._heap = []
+        self._sequence = itertools.count()  # same due time - in the order they were scheduled
+        self.processed = 0
+
+    def schedule(self, delay_ms, fn, *args):
+        heapq.heappush(self._heap, (self.now + delay_ms, next(self._sequence), fn, args))
+
+    def run(self):
+        while self._heap:
+            self.now, _, fn, args = heapq.heappop(self._heap)
+            fn(*args)
+            self.processed += 1
+
+
+class GossipSimulator:
+    """
+    Propagation of one message through the topology, as the list of events the
+    nodes would log. Timestamps are start_ns plus the simulated time.
+    """
+
+    def __init__(self, neighbors, hop_overhead_ms=0.0, ttl=0):
+        self.neighbors = neighbors
+        self.hop_overhead_ms = hop_overhead_ms
+        self.ttl = ttl
+
+    def run(self, initiator, message='sim', start_ns=None):
+        self.message = message
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.queue = EventQueue()
+        self.seen = {initiator}
+        self.events = []
+
+        self._log(initiator, initiator, None, 0, 'initiate', 0,
+                  f"Gossip initiated by {initiator} (simulated) with no latency: 0 ms")
+        self._forward(initiator, initiator, 0)
+        self.queue.run()
+        return self.events
+
+    def _forward(self, node, sender_id, hop_count):
+        # Stop here once the message has used up its hops (protocol.expired)
+        if self.ttl > 0 and hop_count >= self.ttl:
+            return
+        for neighbor, latency in self.neighbors[node]:
+            if neighbor != sender_id:
+                self.queue.schedule(self.hop_overhead_ms + latency, self._receive, neighbor, node, latency,
+                                    hop_count + 1, self.queue.now + self.hop_overhead_ms)
+
+    def _receive(self, node, sender_id, latency, hop_count, send_time):
+        if node in self.seen:
+            self._log(node, sender_id, None, latency, 'duplicate', hop_count,
+                      f"{node} ignoring duplicate message: '{self.message}' from {sender_id} "
+                      f"with latency={latency}ms")
+            return
+        self.seen.add(node)
+        propagation_time = self.queue.now - send_time
+        self._log(node, sender_id, propagation_time, latency, 'received', hop_count,
+                  f"{node} received: '{self.message}' from {sender_id} in {propagation_time:.2f} ms "
+                  f"with latency of: {latency} ms after {hop_count} hops")
+        self._forward(node, sender_id, hop_count)
+
+    def _log(self, node, sender_id, propagation_time, latency_ms, event_type, hop_count, detail):
+        self.events.append({
+            'message': self.message,
+            'sender_id': sender_id,
+            'receiver_id': node,
+            'received_timestamp': self.start_ns + int(self.queue.now * 1e6),
+            'propagation_time': propagation_time,
+            'latency_ms': latency_ms,
+            'event_type': event_type,
+            'hop_count': hop_count,
+            'detail': detail,
+        })
+
+
+class Slots:
+    """Bounded pool of threads (ThreadPoolExecutor workers), processes wait in FIFO order for a free one."""
+
+    def __init__(self, count):
+        self.free = count
+        self.waiting = deque()
+
+
+class _Process:
+    def __init__(self, generator):
+        self.generator = generator
+        self.done = False
+        self.joiners = []  # (process, the processes it waits for)
+
+
+class EmulatedSimulator(GossipSimulator):
+    """
+    Propagation through nodes that work like the implementation of Node, not
+    like the ideal protocol.
+
+    Every handler, forwarder and sender is a simulated thread (a generator that
+    yields ('sleep', ms), ('acquire', slots), ('spawn', generator) or ('join',
+    processes)) and needs a slot of its node's bounded pool first:
+    server_workers handler threads (SERVER_WORKERS), forward_workers forwarder
+    threads (FORWARD_WORKERS, async propagation) and sender_workers sender
+    threads (SENDER_WORKERS, parallel fan-out). The settings are the helm values:
+      propagation        'sync' - the handler forwards before it acks, so every call
+                         blocks its caller until the whole subtree behind it is done
+                         'async' - the handler acks at once, a forwarder thread forwards
+      fanout             'sequential' - sleep the latency, send, then the next neighbor
+                         'parallel' - every neighbor on its own sender thread
+      latency_emulation  'sleep' - a sender thread sleeps the latency
+                         'timer' - the latency is waited without a thread
+    Overheads (ms): handler_ms of work in every handler (duplicates too), rpc_ms
+    per call and channel_setup_ms more on the first call of every edge direction.
+
+    A message stuck because every thread it waits for is blocked (sync propagation
+    with too few server workers) shows up as stalled, as the live node would hang.
+    """
+
+    def __init__(self, neighbors, ttl=0, propagation='sync', fanout='sequential', latency_emulation='sleep',
+                 server_workers=10, forward_workers=4, sender_workers=32, handler_ms=0.0, rpc_ms=0.0,
+                 channel_setup_ms=0.0):
+        super().__init__(neighbors, ttl=ttl)
+        self.propagation = propagation
+        self.fanout = fanout
+        self.latency_emulation = latency_emulation
+        self.server_workers = server_workers
+        self.forward_workers = forward_workers
+        self.sender_workers = sender_workers
+        self.handler_ms = handler_ms
+        self.rpc_ms = rpc_ms
+        self.channel_setup_ms = channel_setup_ms
+
+    def run(self, initiator, message='sim', start_ns=None):
+        self.message = message
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.queue = EventQueue()
+        self.seen = set()
+        self.events = []
+        self.channels = set()  # (node, neighbor) with an open channel
+        self.server_slots = {name: Slots(self.server_workers) for name in self.neighbors}
+        self.forward_slots = {name: Slots(self.forward_workers) for name in self.neighbors}
+        self.sender_slots = {name: Slots(self.sender_workers) for name in self.neighbors}
+        self.running = 0
+
+        # start.py calls SendMessage of the initiator with itself as the sender
+        self._start(self._serve(initiator, initiator, 0, 0, 0.0))
+        self.queue.run()
+        self.stalled = self.running
+        return self.events
+
+    # Simulated threads
+
+    def _start(self, generator):
+        process = _Process(generator)
+        self.running += 1
+        self.queue.schedule(0, self._step, process, None)
+        return process
+
+    def _step(self, process, value):
+        try:
+            command = process.generator.send(value)
+        except StopIteration:
+            process.done = True
+            self.running -= 1
+            for joiner, waited in process.joiners:
+                if all(other.done for other in waited):
+                    self.queue.schedule(0, self._step, joiner, None)
+            return
+
+        kind, argument = command
+        if kind == 'sleep':
+            self.queue.schedule(argument, self._step, process, None)
+        elif kind == 'acquire':
+            if argument.free > 0:
+                argument.free -= 1
+                self.queue.schedule(0, self._step, process, None)
+            else:
+                argument.waiting.append(process)
+        elif kind == 'spawn':
+            self.queue.schedule(0, self._step, process, self._start(argument))
+        elif kind == 'join':
+            pending = [other for other in argument if not other.done]
+            if not pending:
+                self.queue.schedule(0, self._step, process, None)
+            for other in pending:
+                other.joiners.append((process, argument))
+
+    def _release(self, slots):
+        if slots.waiting:
+            self.queue.schedule(0, self._step, slots.waiting.popleft(), None)
+        else:
+            slots.free += 1
+
+    # Node
+
+    def _serve(self, node, sender_id, latency, hop_count, send_time):
+        """SendMessage on a server thread of node."""
+        yield ('acquire', self.server_slots[node])
+        try:
+            yield from self._receive(node, sender_id, latency, hop_count, send_time)
+        finally:
+            self._release(self.server_slots[node])
+
+    def _receive(self, node, sender_id, latency, hop_count, send_time):
+        if sender_id == node and node not in self.seen:
+            self.seen.add(node)
+            self._log(node, sender_id, None, latency, 'initiate', hop_count,
+                      f"Gossip initiated by {node} (emulated) with no latency: {latency} ms")
+        elif node in self.seen:
+            self._log(node, sender_id, None, latency, 'duplicate', hop_count,
+                      f"{node} ignoring duplicate message: '{self.message}' from {sender_id} "
+                      f"with latency={latency}ms")
+            yield ('sleep', self.handler_ms)
+            return
+        else:
+            self.seen.add(node)
+            propagation_time = self.queue.now - send_time
+            self._log(node, sender_id, propagation_time, latency, 'received', hop_count,
+                      f"{node} received: '{self.message}' from {sender_id} in {propagation_time:.2f} ms "
+                      f"with latency of: {latency} ms after {hop_count} hops")
+        yield ('sleep', self.handler_ms)
+
+        if self.ttl > 0 and hop_count >= self.ttl:
+            return
+        if self.propagation == 'async':
+            self._start(self._forward_async(node, sender_id, hop_count))
+            return
+        yield from self._gossip(node, sender_id, hop_count)
+
+    def _forward_async(self, node, sender_id, hop_count):
+        yield ('acquire', self.forward_slots[node])
+        try:
+            yield from self._gossip(node, sender_id, hop_count)
+        finally:
+            self._release(self.forward_slots[node])
+
+    def _gossip(self, node, sender_id, hop_count):
+        """gossip_message: the fan-out to every neighbor except the sender."""
+        targets = [(neighbor, latency) for neighbor, latency in self.neighbors[node] if neighbor != sender_id]
+        if self.fanout == 'sequential':
+            for neighbor, latency in targets:
+                send_time = self.queue.now
+                yield ('sleep', latency)
+                yield from self._call(node, neighbor, latency, hop_count + 1, send_time)
+            return
+
+        sends = []
+        for neighbor, latency in targets:
+            sends.append((yield ('spawn', self._send_parallel(node, neighbor, latency, hop_count + 1))))
+        yield ('join', sends)
+
+    def _send_parallel(self, node, neighbor, latency, hop_count):
+        send_time = self.queue.now
+        if self.latency_emulation == 'timer':
+            yield ('sleep', latency)
+        yield ('acquire', self.sender_slots[node])
+        try:
+            if self.latency_emulation != 'timer':
+                send_time = self.queue.now
+                yield ('sleep', latency)
+            yield from self._call(node, neighbor, latency, hop_count, send_time)
+        finally:
+            self._release(self.sender_slots[node])
+
+    def _call(self, node, neighbor, latency, hop_count, send_time):
+        """Blocking unary SendMessage from node to neighbor."""
+        overhead = self.rpc_ms
+        if (node, neighbor) not in self.channels:
+            self.channels.add((node, neighbor))
+            overhead += self.channel_setup_ms
+        yield ('sleep', overhead)
+        handler = yield ('spawn', self._serve(neighbor, node, latency, hop_count, send_time))
+        yield ('join', [handler])
+
+
+def read_events(path):
+    """Gossip events of a JSON lines file (simulated, or the stdout of live nodes, other lines are skipped)."""
+    events = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'event_type' in event:
+                events.append(event)
+    return events
+
+
+def first_receive_times(events):
+    """Initiator and ms from the initiation to the first receive of every other node, of one message."""
+    initiator = None
+    initiated = None
+    received = {}
+    for event in sorted(events, key=lambda event: event['received_timestamp']):
+        if event['event_type'] == 'initiate' and initiated is None:
+            initiator, initiated = event['receiver_id'], event['received_timestamp']
+        elif event['event_type'] == 'received':
+            received.setdefault(event['receiver_id'], event['received_timestamp'])
+    if initiated is None:
+        return None, {}
+    return initiator, {node: (timestamp - initiated) / 1e6 for node, timestamp in received.items()}
+
+
+def duplicate_counts(events):
+    counts = defaultdict(int)
+    for event in events:
+        if event['event_type'] == 'duplicate':
+            counts[event['receiver_id']] += 1
+    return dict(counts)
+
+
+def coverage_curve(times, total_nodes):
+    """(ms, fraction of the nodes reached) at every first receive, the initiator is reached at 0 ms."""
+    curve = [(0.0, 1 / total_nodes)]
+    for i, elapsed in enumerate(sorted(times.values()), start=2):
+        curve.append((elapsed, i / total_nodes))
+    return curve
+
+
+def coverage_time(curve, fraction):
+    """ms until fraction of the nodes were reached, None if they never were."""
+    for elapsed, covered in curve:
+        if covered >= fraction - 1e-9:
+            return elapsed
+    return None
+
+
+def summarize(events, total_nodes):
+    initiator, times = first_receive_times(events)
+    curve = coverage_curve(times, total_nodes)
+    return {
+        'initiator': initiator,
+        'reached': len(times) + 1,
+        'total_nodes': total_nodes,
+        'duplicates': sum(duplicate_counts(events).values()),
+        'coverage_50_ms': coverage_time(curve, 0.5),
+        'coverage_90_ms': coverage_time(curve, 0.9),
+        'coverage_99_ms': coverage_time(curve, 0.99),
+        'coverage_100_ms': coverage_time(curve, 1.0),
+    }
+
+
+def write_per_node(path, events, names):
+    """CSV of the first receive time (ms), hops and duplicates of every node."""
+    initiator, times = first_receive_times(events)
+    duplicates = duplicate_counts(events)
+    hops = {}
+    for event in events:
+        if event['event_type'] == 'received':
+            hops.setdefault(event['receiver_id'], event['hop_count'])
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['node', 'first_receive_ms', 'hop_count', 'duplicates'])
+        for name in names:
+            first = 0.0 if name == initiator else times.get(name)
+            writer.writerow([name, '' if first is None else f"{first:.3f}", 0 if name == initiator else hops.get(name, ''),
+                             duplicates.get(name, 0)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python gossip_sim.py --topology <json> [--out <jsonl>]")
+    parser.add_argument('--topology', required=True, help="Topology JSON (topology/ or topology_kmeans/ file)")
+    parser.add_argument('--initiator', default='gossip-statefulset-0', help="Node that initiates the message")
+    parser.add_argument('--message', default='', help="Message text (default: <topology file>-sim)")
+    parser.add_argument('--latency_option', default='weight', help="Edge attribute used as latency (LATENCY_OPTION)")
+    parser.add_argument('--hop_overhead_ms', type=float, default=0.0, help="Handling time of a node before it forwards")
+    parser.add_argument('--ttl', type=int, default=0, help="Maximum hops (GOSSIP_TTL, 0 - unlimited)")
+    parser.add_argument('--mode', default='ideal', choices=['ideal', 'emulation'], help="Ideal protocol or the node as implemented")
+    parser.add_argument('--propagation', default='sync', help="PROPAGATION_MODE of the emulation (sync or async)")
+    parser.add_argument('--fanout', default='sequential', help="FANOUT_MODE of the emulation (sequential or parallel)")
+    parser.add_argument('--latency_emulation', default='sleep', help="LATENCY_EMULATION of the emulation (sleep or timer)")
+    parser.add_argument('--server_workers', type=int, default=10, help="SERVER_WORKERS of the emulation")
+    parser.add_argument('--forward_workers', type=int, default=4, help="FORWARD_WORKERS of the emulation")
+    parser.add_argument('--sender_workers', type=int, default=32, help="SENDER_WORKERS of the emulation")
+    parser.add_argument('--handler_ms', type=float, default=0.0, help="Work of every handler call (emulation)")
+    parser.add_argument('--rpc_ms', type=float, default=0.0, help="Overhead of every call (emulation)")
+    parser.add_argument('--channel_setup_ms', type=float, default=0.0, help="Extra cost of the first call of an edge (emulation)")
+    parser.add_argument('--out', default='', help="Write the events to this JSON lines file")
+    parser.add_argument('--per_node', default='', help="Write the per-node first receive times to this CSV file")
+    args = parser.parse_args()
+
+    topology = load_topology(args.topology)
+    names, neighbors = load_neighbors(topology, args.latency_option)
+    message = args.message or f"{args.topology.rsplit('/', 1)[-1][:-5]}-sim"
+
+    start = time.perf_counter()
+    simulator = GossipSimulator(neighbors, hop_overhead_ms=args.hop_overhead_ms, ttl=args.ttl)
+    events = simulator.run(args.initiator, message)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    ideal = summarize(events, len(names))
+
+    if args.mode == 'emulation':
+        start = time.perf_counter()
+        simulator = EmulatedSimulator(neighbors, ttl=args.ttl, propagation=args.propagation, fanout=args.fanout,
+                                      latency_emulation=args.latency_emulation, server_workers=args.server_workers,
+                                      forward_workers=args.forward_workers, sender_workers=args.sender_workers,
+                                      handler_ms=args.handler_ms, rpc_ms=args.rpc_ms,
+                                      channel_setup_ms=args.channel_setup_ms)
+        events = simulator.run(args.initiator, message)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+    if args.per_node:
+        write_per_node(args.per_node, events, names)
+
+    summary = summarize(events, len(names))
+    print(f"{len(names)} nodes, {len(events)} events, {simulator.queue.processed} simulation steps "
+          f"in {elapsed_ms:.1f} ms", flush=True)
+    if args.mode == 'ideal':
+        for key, value in summary.items():
+            print(f"{key}: {f'{value:.2f}' if isinstance(value, float) else value}", flush=True)
+    else:
+        # How much of the emulated time is the protocol (ideal) and how much the implementation
+        if simulator.stalled:
+            print(f"stalled: {simulator.stalled} simulated threads never finished (all server workers blocked)",
+                  flush=True)
+        print(f"{'':<18}{'ideal':>12}{'emulated':>12}{'overhead':>12}", flush=True)
+        for key in summary:
+            if key in ('initiator', 'total_nodes'):
+                continue
+            values = [ideal[key], summary[key]]
+            cells = [f"{value:.2f}" if isinstance(value, float) else str(value) for value in values]
+            overhead = (f"{values[1] - values[0]:.2f}" if all(isinstance(value, (int, float)) for value in values)
+                        else "-")
+            print(f"{key:<18}{cells[0]:>12}{cells[1]:>12}{overhead:>12}", flush=True)
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+from topology_index import FILENAME_PATTERN, file_hash, select_files
+
+# Propagation latency of a topology from every possible initiator at once.
+#
+# automate.py always initiates from gossip-statefulset-0, so one test only tells
+# about one origin. The first receive time of a node in the ideal protocol is its
+# shortest-path latency from the initiator (gossip_sim.py --mode ideal), so with
+# the topology as a sparse CSR matrix, csgraph.dijkstra gives them for all
+# initiators at once. Per initiator:
+#   max_latency_ms   time to full coverage (latency eccentricity)
+#   mean_latency_ms  mean first receive time over the other nodes
+#   hop_depth        hops of the slowest first-arrival path (hop_count in the logs)
+#   hop_eccentricity fewest hops to the farthest node
+# and the distribution of each over the initiators is reported per topology, for
+# the topology and topology_kmeans files side by side:
+#
+# python graph_analysis.py --model BA --out analysis.csv
+#
+# Results are cached in analysis_cache/ by the SHA-256 of the topology file.
+# The initiators are done in chunks, on --workers processes.
+
+CACHE_DIR = "analysis_cache"
+CACHE_VERSION = 1
+METRICS = ('max_latency_ms', 'mean_latency_ms', 'hop_depth', 'hop_eccentricity')
+DEFAULT_INITIATOR = "gossip-statefulset-0"
+
+
+def to_csr(topology, latency_option='weight'):
+    """Node ids and the symmetric latency matrix (CSR) of a topology, the lowest latency of repeated edges."""
+    names = [node['id'] for node in topology['nodes']]
+    rows = {name: i for i, name in enumerate(names)}
+    latencies = {}
+    for edge in topology['edges']:
+        u, v = rows[edge['source']], rows[edge['target']]
+        key = (min(u, v), max(u, v))
+        latencies[key] = min(latencies.get(key, float('inf')), float(edge[latency_option]))
+    pairs = np.array(list(latencies.keys()), dtype=np.int64).reshape(-1, 2)
+    values = np.array(list(latencies.values()), dtype=np.float64)
+    graph = coo_matrix((np.concatenate([values, values]),
+                        (np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))),
+                       shape=(len(names), len(names)))
+    return names, graph.tocsr()
+
+
+def _path_hops(predecessors):
+    """Hops from the source to every node along the predecessor tree, by pointer jumping (-1 unreachable)."""
+    count = predecessors.shape[1]
+    reached = predecessors >= 0
+    parent = np.where(reached, predecessors, np.arange(count))
+    hops = reached.astype(np.int32)
+    while True:
+        grandparent = np.take_along_axis(parent, parent, axis=1)
+        hops = hops + np.take_along_axis(hops, parent, axis=1)
+        if np.array_equal(grandparent, parent):
+            break
+        parent = grandparent
+    return hops
+
+
+def _hop_eccentricity(graph, sources):
+    """Fewest hops to the farthest reachable node of every source, breadth first for all sources at once."""
+    adjacency = (graph != 0).astype(np.float32)
+    visited = np.zeros((graph.shape[0], len(sources)), dtype=bool)  # node x source
+    visited[sources, np.arange(len(sources))] = True
+    frontier = visited.astype(np.float32)
+    eccentricity = np.zeros(len(sources))
+    level = 0
+    while True:
+        reached = (adjacency @ frontier > 0) & ~visited
+        if not reached.any():
+            return eccentricity
+        level += 1
+        eccentricity[reached.any(axis=0)] = level
+        visited |= reached
+        frontier = reached.astype(np.float32)
+
+
+def _analyze_chunk(graph, sources):
+    # The matrix is symmetric, directed=True gives the same paths without symmetrizing it on every call
+    latency, predecessors = dijkstra(graph, directed=True, indices=sources, return_predecessors=True)
+    depth = _path_hops(predecessors)
+
+    reachable = np.isfinite(latency)
+    others = np.maximum(reachable.sum(axis=1) - 1, 1)
+    return sources, {
+        'max_latency_ms': np.where(reachable, latency, -np.inf).max(axis=1),
+        'mean_latency_ms': np.where(reachable, latency, 0).sum(axis=1) / others,
+        'hop_depth': np.where(reachable, depth, 0).max(axis=1),
+        'hop_eccentricity': _hop_eccentricity(graph, sources),
+        'reachable': reachable.sum(axis=1),
+    }
+
+
+def analyze(topology, latency_option='weight', chunk_size=256, workers=1):
+    """Node ids and the per-initiator metrics (one array per METRICS entry, indexed like the ids)."""
+    names, graph = to_csr(topology, latency_option)
+    count = len(names)
+    results = {metric: np.empty(count) for metric in METRICS}
+    results['reachable'] = np.empty(count, dtype=np.int64)
+
+    # Chunks of initiators, an N x N matrix of a 10k node graph would not fit in memory
+    chunks = [np.arange(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = list(pool.map(_analyze_chunk, [graph] * len(chunks), chunks))
+    else:
+        done = [_analyze_chunk(graph, sources) for sources in chunks]
+    for sources, chunk in done:
+        for name, values in chunk.items():
+            results[name][sources] = values
+    return names, results
+
+
+def analyze_file(path, latency_option='weight', cache_dir=CACHE_DIR, workers=1):
+    """analyze() of a topology file, from the cache when the same file content was analyzed before."""
+    key = f"{file_hash(path)}-{latency_option}-v{CACHE_VERSION}"
+    cache_path = os.path.join(cache_dir, f"{key}.npz") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path, allow_pickle=False)
+        return list(cached['names']), {name: cached[name] for name in METRICS + ('reachable',)}, True
+
+    with open(path, 'r') as f:
+        topology = json.load(f)
+    names, results = analyze(topology, latency_option, workers=workers)
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(cache_path, names=np.array(names), **results)
+    return names, results, False
+
+
+def distribution(values):
+    return {
+        'min': float(np.min(values)),
+        'p50': float(np.percentile(values, 50)),
+        'mean': float(np.mean(values)),
+        'p90': float(np.percentile(values, 90)),
+        'max': float(np.max(values)),
+    }
+
+
+def summarize(path, names, results):
+    """One row per topology: size, the distribution of every metric and where the default initiator falls."""
+    match = FILENAME_PATTERN.match(os.path.basename(path))
+    row = {
+        'file': os.path.basename(path),
+        'cluster': '1' if os.path.basename(path).startswith('kmeans_') else '0',
+        'model': match.group(2) if match else '',
+        'nodes': len(names),
+        'connected': bool(np.all(results['reachable'] == len(names))),
+    }
+    for metric in METRICS:
+        for stat, value in distribution(results[metric]).items():
+            row[f"{metric}_{stat}"] = value
+    if DEFAULT_INITIATOR in names:
+        index = names.index(DEFAULT_INITIATOR)
+        row['default_max_latency_ms'] = float(results['max_latency_ms'][index])
+        # Share of the initiators that reach every node faster than the default one
+        row['default_percentile'] = float(np.mean(results['max_latency_ms'] < results['max_latency_ms'][index]) * 100)
+    return row
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python graph_analysis.py --model BA [--cluster all] [--out analysis.csv]")
+    parser.add_argument('--topology', nargs='*', default=[], help="Topology files (default: selected by --cluster/--model)")
+    parser.add_argument('--cluster', default='all', help="0 - topology, 1 - topology_kmeans, all - both")
+    parser.add_argument('--model', default='', help="Network model (BA or ER), empty - all")
+    parser.add_argument('--target_filename', default='', help="Only this topology file")
+    parser.add_argument('--latency_option', default='weight', help="Edge attribute used as latency (LATENCY_OPTION)")
+    parser.add_argument('--cache_dir', default=CACHE_DIR, help="Cache folder, empty - no cache")
+    parser.add_argument('--out', default='', help="Write the per-topology summary to this CSV file")
+    parser.add_argument('--per_initiator', default='', help="Write the metrics of every initiator to this CSV file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for the initiator chunks")
+    args = parser.parse_args()
+
+    files = args.topology or select_files(args.cluster, args.model, args.target_filename)
+    rows = []
+    per_initiator = []
+    for path in files:
+        start = time.perf_counter()
+        names, results, cached = analyze_file(path, args.latency_option, args.cache_dir, args.workers)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        row = summarize(path, names, results)
+        rows.append(row)
+        print(f"{row['file']}: {row['nodes']} nodes, {'cached' if cached else f'{elapsed_ms:.0f} ms'}", flush=True)
+        for metric in METRICS:
+            print(f"  {metric:<18}" + "".join(f"{stat}={row[f'{metric}_{stat}']:.1f}  "
+                                              for stat in ('min', 'p50', 'mean', 'p90', 'max')), flush=True)
+        if 'default_percentile' in row:
+            print(f"  {DEFAULT_INITIATOR}: full coverage in {row['default_max_latency_ms']:.1f} ms, "
+                  f"{row['default_percentile']:.0f}% of the initiators are faster", flush=True)
+        if not row['connected']:
+            print("  not connected, some initiators never reach every node", flush=True)
+        if args.per_initiator:
+            for i, name in enumerate(names):
+                per_initiator.append({'file': row['file'], 'initiator': name,
+                                      **{metric: float(results[metric][i]) for metric in METRICS}})
+
+    for path, data in ((args.out, rows), (args.per_initiator, per_initiator)):
+        if path and data:
+            with open(path, 'w', newline='') as f:
+                fieldnames = list(dict.fromkeys(key for item in data for key in item))
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(data)
@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in ms, from sub-ms handler times up to multi-second floods
+DEFAULT_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def samples(self):
+        """(suffix, extra labels, value) of every sample, buckets cumulative as in Prometheus."""
+        with self._lock:
+            samples = []
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+                cumulative += count
+                samples.append(("_bucket", (("le", str(bound)),), cumulative))
+            samples.append(("_sum", (), self.sum))
+            samples.append(("_count", (), self.count))
+            return samples
+
+
+class MetricsRegistry:
+    """
+    In-process counters, histograms and gauges of a node.
+
+    Counters, gauges and histograms are created on first use by name (and labels).
+    Gauges can also come from collectors, functions returning a dict of current
+    values (e.g. DedupCache.stats), that are called when the metrics are read.
+    render() gives them in the Prometheus text format, snapshot() as a flat dict.
+    """
+
+    def __init__(self, prefix="gossip_"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> Counter
+        self._gauges = {}      # (name, labels) -> Gauge
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._collectors = []
+
+    def counter(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = Counter()
+            return self._counters[key]
+
+    def gauge(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._gauges:
+                self._gauges[key] = Gauge()
+            return self._gauges[key]
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS_MS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def samples(self):
+        """Every sample as (name, labels, value)."""
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            histograms = list(self._histograms.items())
+
+        samples = []
+        for (name, labels), counter in sorted(counters):
+            samples.append((f"{self.prefix}{name}_total", labels, counter.value))
+        for (name, labels), gauge in sorted(gauges, key=lambda item: item[0]):
+            samples.append((f"{self.prefix}{name}", labels, gauge.value))
+        for (name, labels), histogram in sorted(histograms, key=lambda item: item[0]):
+            for suffix, extra, value in histogram.samples():
+                samples.append((f"{self.prefix}{name}{suffix}", labels + extra, value))
+        for collector in self._collectors:
+            for name, value in collector().items():
+                if isinstance(value, (int, float)):
+                    samples.append((f"{self.prefix}{name}", (), value))
+        return samples
+
+    def render(self):
+        return "".join(f"{name}{_label_str(labels)} {value}\n" for name, labels, value in self.samples())
+
+    def snapshot(self):
+        return {f"{name}{_label_str(labels)}": float(value) for name, labels, value in self.samples()}
+
+
+class InstrumentedThreadPoolExecutor(futures.ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor of the gRPC server that measures, for every handler, the time
+    it waited in the pool queue before a worker picked it up, and how many workers
+    are busy.
+    """
+
+    def __init__(self, max_workers, metrics):
+        super().__init__(max_workers=max_workers)
+        self.metrics = metrics
+        self.queue_time = metrics.histogram("handler_queue_time_ms")
+        self._busy_lock = threading.Lock()
+        self.busy = 0
+        metrics.register_collector(lambda: {'server_workers_busy': self.busy, 'server_workers': max_workers})
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(self._measured, time.perf_counter(), fn, *args, **kwargs)
+
+    def _measured(self, submitted, fn, *args, **kwargs):
+        self.queue_time.observe((time.perf_counter() - submitted) * 1000)
+        with self._busy_lock:
+            self.busy += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._busy_lock:
+                self.busy -= 1
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # No access log on stdout, it is reserved for the gossip events
+        pass
+
+
+def start_http_server(registry, port):
+    """Serves registry.render() on http://<pod>:<port>/metrics from a background thread."""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer(('', port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
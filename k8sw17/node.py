@@ -1,12 +1,28 @@
-from kubernetes import client, config
+import time
+# Process start, for the startup phase timings (taken before the imports below)
+PROCESS_START = time.perf_counter()
 import grpc
 import os
 import socket
 from concurrent import futures
 import gossip_pb2
 import gossip_pb2_grpc
+from forwarder import ForwardingEngine, FanOutEngine
+from channel_pool import ChannelPool, SERVER_KEEPALIVE_OPTIONS
+from resolver import PeerResolver
+from scheduler import DelayScheduler
+from dedup import DedupCache, SharedDedupTable
+import protocol
+from stream_transport import StreamPool, StreamClosed
+from batcher import Batcher
+from event_logger import EventLogger, create_sink
+from metrics import MetricsRegistry, InstrumentedThreadPoolExecutor, start_http_server
+from tracing import Tracer, NULL_TRACE
+from topology_index import lookup_neighbors
+from send_queue import NeighborQueues
 import json
-import time
+import multiprocessing
+import signal
 import logging
 # import subprocess
 
@@ -16,38 +32,197 @@ import logging
 
 
 class Node(gossip_pb2_grpc.GossipServiceServicer):
-    def __init__(self, service_name):
-
-        self.pod_name = socket.gethostname()
-        self.host = socket.gethostbyname(self.pod_name)
+    def __init__(self, service_name, worker_id=None, received_messages=None, config=None, pod_name=None,
+                 neighbor_pods=None, resolver=None, channels=None, event_logger=None, forward_executor=None,
+                 sender_pool=None, scheduler=None):
+
+        # Startup phase -> ms, printed once the node is serving (and in the metrics)
+        self.startup = {'imports': (time.perf_counter() - PROCESS_START) * 1000}
+        self._startup_mark = time.perf_counter()
+
+        # Settings (from helm values through the environment). The virtual cluster
+        # (virtual_cluster.py) runs many nodes in one process, it hands every node the
+        # same config and its own name, neighbors and the shared components below
+        self.config = os.environ if config is None else config
+        self.pod_name = pod_name or socket.gethostname()
+        self.host = socket.gethostbyname(self.pod_name) if pod_name is None else "in-process"
         self.port = '5050'
         self.service_name = service_name
 
+        # Worker process of a multi-process node (SERVER_PROCESSES > 1), None for a single process.
+        # Workers share port 5050 but have their own metrics port, event files and trace file
+        self.worker_id = worker_id
+        worker_suffix = "" if worker_id is None else f"-w{worker_id}"
+
+        # Event logging (from helm values)
+        # 'sync' - every event is printed by the handler itself
+        # 'async' - handlers only queue the event, a background writer prints them in batches
+        # LOG_SINK: 'json' - JSON lines on stdout, 'binary' - protobuf records in LOG_DIR files
+        self.event_logger = event_logger
+        if self.event_logger is None:
+            sink = create_sink(self.config.get('LOG_SINK', 'json'), self.pod_name + worker_suffix,
+                               directory=self.config.get('LOG_DIR', 'events'),
+                               max_bytes=int(self.config.get('LOG_FILE_MAX_BYTES', str(64 * 1024 * 1024))),
+                               max_files=int(self.config.get('LOG_MAX_FILES', '0')))
+            self.event_logger = EventLogger(sink, asynchronous=self.config.get('LOG_MODE', 'sync') == 'async',
+                                            batch_size=int(self.config.get('LOG_BATCH_SIZE', '256')),
+                                            flush_interval=float(self.config.get('LOG_FLUSH_INTERVAL', '0.5')),
+                                            max_queue=int(self.config.get('LOG_MAX_QUEUE', '100000')),
+                                            drop_policy=self.config.get('LOG_DROP_POLICY', 'drop_newest'))
+
+        # Neighbors given by the virtual cluster, which loads the topology once for all of its nodes
+        self.topology = None
+        self.neighbor_pods = neighbor_pods
+        if self.neighbor_pods is None:
+            self.neighbor_pods = self._load_neighbors()
+        print(f"{self.pod_name}({self.host}) neighbors: {self.neighbor_pods}", flush=True)
+
+        # Neighbor IPs are resolved in start_server, once the port is bound
+        self.resolver = resolver or PeerResolver(service_name=self.service_name)
+        self._startup_phase('topology')
+
+        # Messages seen so far (bounded, entries expire after DEDUP_TTL seconds)
+        # Worker processes share one table in shared memory instead
+        self.received_messages = received_messages
+        if self.received_messages is None:
+            self.received_messages = DedupCache(capacity=int(self.config.get('DEDUP_CAPACITY', '100000')),
+                                                ttl=float(self.config.get('DEDUP_TTL', '3600')))
+
+        # Maximum hops of the messages initiated here (0 - unlimited)
+        self.gossip_ttl = int(self.config.get('GOSSIP_TTL', '0'))
+
+        # Propagation mode (from helm values)
+        # 'sync' - SendMessage forwards to neighbors before acknowledging (blocking)
+        # 'async' - SendMessage acknowledges right away and the forwarding
+        #           engine propagates the message in the background
+        self.propagation_mode = self.config.get('PROPAGATION_MODE', 'sync')
+        self.forwarder = ForwardingEngine(self.gossip_message, on_complete=self._forward_complete,
+                                          num_workers=int(self.config.get('FORWARD_WORKERS', '4')),
+                                          executor=forward_executor)
+        if self.propagation_mode == 'async':
+            self.forwarder.start()
+
+        # Fan-out mode (from helm values)
+        # 'sequential' - sleep and send to one neighbor after another
+        # 'parallel' - send to all neighbors at once, each with its own latency
+        self.fanout_mode = self.config.get('FANOUT_MODE', 'sequential')
+        self.fanout = FanOutEngine(self._send_to_neighbor, max_workers=int(self.config.get('SENDER_WORKERS', '32')),
+                                   pool=sender_pool)
+
+        # Latency emulation of the parallel fan-out (from helm values)
+        # 'sleep' - each send sleeps for its latency on a sender thread
+        # 'timer' - sends wait on the delay scheduler's heap without holding a thread
+        self.latency_emulation = self.config.get('LATENCY_EMULATION', 'sleep')
+        # The sequential fan-out sleeps on its own thread, it would never use the scheduler
+        if self.latency_emulation == 'timer' and self.fanout_mode != 'parallel':
+            raise ValueError("LATENCY_EMULATION=timer needs FANOUT_MODE=parallel")
+        self.scheduler = scheduler
+        if self.latency_emulation == 'timer' and self.scheduler is None:
+            self.scheduler = DelayScheduler(self.fanout.pool)
+
+        # Persistent channels to the neighbors, reused by every message
+        self.channels = channels or ChannelPool(gossip_pb2_grpc.GossipServiceStub)
+
+        # Transport to the neighbors (from helm values)
+        # 'unary' - one SendMessage call per message
+        # 'stream' - one long-lived GossipStream per neighbor, unary as fallback
+        # 'batch' - messages to the same neighbor are coalesced into SendBatch calls,
+        #           flushed at BATCH_SIZE messages or after BATCH_LINGER_MS
+        self.transport = self.config.get('TRANSPORT', 'unary')
+
+        # Deadline of every send to a neighbor in ms (0 - none, sync propagation waits for the
+        # whole subtree of a neighbor before its ack, so set it above the propagation time)
+        self.send_deadline = float(self.config.get('SEND_DEADLINE_MS', '0')) / 1000 or None
+
+        # A stream carries one message at a time, in sync propagation its ack waits for the
+        # neighbor's whole subtree and the messages behind it wait too, round a cycle forever
+        if self.transport == 'stream' and self.propagation_mode != 'async':
+            raise ValueError("TRANSPORT=stream needs PROPAGATION_MODE=async")
+        self.streams = StreamPool(self.channels)
+        self.batcher = None
+        if self.transport == 'batch':
+            # A send waits for its batch, without a deadline the waits of a cycle of sync
+            # nodes never end
+            if self.send_deadline is None:
+                raise ValueError("TRANSPORT=batch needs SEND_DEADLINE_MS above 0")
+            # The batches are flushed on their own BATCH_WORKERS threads, not on the sender
+            # pool whose threads wait for them
+            self.batcher = Batcher(self._send_batch, max_workers=int(self.config.get('BATCH_WORKERS', '8')),
+                                   max_batch_size=int(self.config.get('BATCH_SIZE', '32')),
+                                   linger_ms=float(self.config.get('BATCH_LINGER_MS', '5')))
+
+        # Per-neighbor outbound queues of the unary transport (from helm values)
+        # 'off' - the fan-out makes (and waits for) every send itself
+        # 'on' - sends go to a bounded queue per neighbor (SEND_QUEUE_SIZE) drained by its own
+        #        worker, retried SEND_RETRIES times with backoff, and skipped while the neighbor's
+        #        circuit breaker is open (BREAKER_THRESHOLD failures in a row, for BREAKER_RESET seconds)
+        self.send_queues = None
+        if self.config.get('SEND_QUEUE', 'off') == 'on':
+            # The queue worker of a neighbor sends one message at a time, a call without a
+            # deadline could hold up its queue and every sender waiting on it forever
+            if self.send_deadline is None:
+                raise ValueError("SEND_QUEUE=on needs SEND_DEADLINE_MS above 0")
+            self.send_queues = NeighborQueues(self._call_unary, max_queue=int(self.config.get('SEND_QUEUE_SIZE', '1000')),
+                                              deadline=self.send_deadline,
+                                              max_retries=int(self.config.get('SEND_RETRIES', '3')),
+                                              breaker_threshold=int(self.config.get('BREAKER_THRESHOLD', '5')),
+                                              breaker_reset=float(self.config.get('BREAKER_RESET', '10')))
+
+        # In-process metrics, served on METRICS_PORT (/metrics) and by the GetStats RPC
+        self.metrics = MetricsRegistry()
+        self.metrics_port = int(self.config.get('METRICS_PORT', '9100')) + (worker_id or 0)
+        for component in (self.received_messages, self.channels, self.resolver, self.streams, self.event_logger,
+                          self.scheduler, self.batcher, self.send_queues):
+            if component is not None:
+                self.metrics.register_collector(component.stats)
+        self.metrics.register_collector(lambda: {'forward_pending': self.forwarder.pending()})
+
+        # Timing spans of the sampled messages (TRACE_SAMPLE_RATE, 0 - off), dumped by the GetTraces RPC
+        # and also appended to TRACE_FILE when it is set
+        self.tracer = Tracer(self.pod_name, sample_rate=float(self.config.get('TRACE_SAMPLE_RATE', '0')),
+                             capacity=int(self.config.get('TRACE_BUFFER_SIZE', '10000')),
+                             path=self.config.get('TRACE_FILE') + worker_suffix if self.config.get('TRACE_FILE') else None)
+        self.metrics.register_collector(self.tracer.stats)
+        self.metrics.register_collector(
+            lambda: {f'startup_{phase}_ms': elapsed_ms for phase, elapsed_ms in self.startup.items()})
+
+        # Standard gRPC health service (readinessProbe), set up in start_server
+        self.health = None
+        self._startup_phase('init')
+
+    def _load_neighbors(self):
         # Load the topology from the "topology" or "topology_kmeans" folder
-        # if os.environ['CLUSTER'] == 0, choose "topology" folder
-        # if os.environ['CLUSTER'] == 1, choose "topology_kmeans" folder
-        if os.environ['CLUSTER'] == '0':
+        # if self.config['CLUSTER'] == 0, choose "topology" folder
+        # if self.config['CLUSTER'] == 1, choose "topology_kmeans" folder
+        if self.config['CLUSTER'] == '0':
             topology_folder = "topology"
-        elif os.environ['CLUSTER'] == '1':
+        elif self.config['CLUSTER'] == '1':
             topology_folder = "topology_kmeans"
 
         # Load the topology based on model network required
         # BA = Barabási–Albert Network Model
         # ER = Erdös – Rényi(ER) Network Model
-        topology_model = os.environ['MODEL']
+        topology_model = self.config['MODEL']
+
+        # Neighbors from the compiled topology index (topology_index.py), only this node's
+        # adjacency row is read instead of the whole graph
+        neighbor_pods = lookup_neighbors(self.config['CLUSTER'], self.config['NODES'], topology_model,
+                                         self.pod_name, self.config['LATENCY_OPTION'])
+        if neighbor_pods is not None:
+            return neighbor_pods
 
         # get topology based on model, cluster (or other cluster) and total number of nodes
-        self.topology = self.get_topology(os.environ['NODES'], topology_folder, topology_model)
+        self.topology = self.get_topology(self.config['NODES'], topology_folder, topology_model)
 
         # Find neighbors based on the topology (with latency)
         # but not from the real network
-        self.neighbor_pods = self._find_neighbors(self.pod_name)
-        print(f"{self.pod_name}({self.host}) neighbors: {self.neighbor_pods}", flush=True)
-
-        self.received_messages = set()
+        return self._find_neighbors(self.pod_name)
 
-        self.gossip_initiated = False
-        self.initial_gossip_timestamp = None
+    def _startup_phase(self, phase):
+        """Records the time since the previous phase as phase."""
+        now = time.perf_counter()
+        self.startup[phase] = (now - self._startup_mark) * 1000
+        self._startup_mark = now
 
     def get_topology(self, total_replicas, topology_folder, model, statefulset_name="gossip-statefulset",  namespace="default"):
         """
@@ -64,9 +239,9 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
 
         # select search (keywords) based on non-cluster or other cluster types
         # it will be more than one cluster here
-        if os.environ['CLUSTER'] == '0':
+        if self.config['CLUSTER'] == '0':
             search_str = f'nodes{total_replicas}_'
-        elif os.environ['CLUSTER'] == '1':
+        elif self.config['CLUSTER'] == '1':
             search_str = f'kmeans_nodes{total_replicas}_'
 
         # Find the corresponding topology file
@@ -88,16 +263,26 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         else:
             raise FileNotFoundError(f"No topology file found for {total_replicas} nodes.")
 
-    def get_pod_ip(self, pod_name, namespace="default"):
-        config.load_incluster_config()
-        v1 = client.CoreV1Api()
-        pod = v1.read_namespaced_pod(name=pod_name, namespace=namespace)
-        return pod.status.pod_ip
+    def get_pod_ip(self, pod_name):
+        return self.resolver.resolve(pod_name)
 
     # Receiving message from other nodes
     # and distribute it to others
     def SendMessage(self, request, context):
-        message = request.message
+        # Messages from version 1 senders get their id/origin/hop fields filled here,
+        # from now on the message is only identified (dedup, routing) by its id
+        request = protocol.upgrade(request, ttl=self.gossip_ttl)
+        # A message taken in by its own initiator (start.py) gets GOSSIP_TTL, unless it has a ttl already
+        if request.sender_id == self.pod_name and request.hop_count == 0 and request.ttl == 0:
+            request.ttl = self.gossip_ttl
+        trace = self.tracer.start(request.message_id, context.invocation_metadata())
+        try:
+            return self._receive(request, trace)
+        finally:
+            trace.end()
+
+    def _receive(self, request, trace):
+        message = protocol.text(request)
         sender_id = request.sender_id
         received_timestamp = time.time_ns()
 
@@ -106,72 +291,217 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         # Depends on the latency of the current neighbor latency info
         received_latency = request.latency_ms
 
-        # Check for message initiation and set the initial timestamp
-        if sender_id == self.pod_name and not self.gossip_initiated:
-            self.gossip_initiated = True
-            self.initial_gossip_timestamp = received_timestamp
+        # Check for message initiation, once per message: the id is recorded as seen right away,
+        # so concurrent initiations (of other messages, from other origins) don't interfere
+        if sender_id == self.pod_name and not self.received_messages.check_and_add_digest(request.message_id):
             log_message = (f"Gossip initiated by {self.pod_name}({self.host}) at "
                            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(received_timestamp / 1e9))}"
                            f"with no latency: {received_latency} ms")
             self._log_event(message, sender_id, received_timestamp, None,
-                            received_latency, 'initiate', log_message)
-            self.gossip_initiated = False  # For multiple tests, need to reset gossip initialization
+                            received_latency, 'initiate', log_message, request.hop_count, trace)
+            self.metrics.counter('initiated').inc()
 
         # Check for duplicate messages
-        elif message in self.received_messages:
+        elif self._is_duplicate(request, trace):
             log_message = (f"{self.pod_name}({self.host}) ignoring duplicate message: '{message}' "
                            f"from {sender_id} with latency={received_latency}ms")
-            self._log_event(message, sender_id, received_timestamp, None,received_latency, 'duplicate', log_message)
+            self._log_event(message, sender_id, received_timestamp, None,received_latency, 'duplicate', log_message,
+                            request.hop_count, trace)
+            self.metrics.counter('duplicate').inc()
             return gossip_pb2.Acknowledgment(details=f"Duplicate message ignored by {self.pod_name}({self.host})")
 
         # Send to message neighbor (that is  not receiving the message yet)
         else:
-            self.received_messages.add(message)
             propagation_time = (received_timestamp - request.timestamp) / 1e6
             log_message = (f"{self.pod_name}({self.host}) received: '{message}' from {sender_id}"
-                           f" in {propagation_time:.2f} ms with latency of: {received_latency} ms")
-            self._log_event(message, sender_id, received_timestamp, propagation_time,received_latency, 'received', log_message)
+                           f" in {propagation_time:.2f} ms with latency of: {received_latency} ms"
+                           f" after {request.hop_count} hops")
+            self._log_event(message, sender_id, received_timestamp, propagation_time,received_latency, 'received', log_message,
+                            request.hop_count, trace)
+            self.metrics.counter('received').inc()
+
+        # Stop here once the message has used up its hops
+        if protocol.expired(request):
+            return gossip_pb2.Acknowledgment(details=f"{self.pod_name}({self.host}) received: '{message}' (ttl reached)")
 
         # Gossip to neighbors (only if the message is new)
-        self.gossip_message(message, sender_id)
+        # In async mode, acknowledge right away and let the forwarding engine do the rest
+        if self.propagation_mode == 'async':
+            self.forwarder.submit(request, sender_id, trace)
+            return gossip_pb2.Acknowledgment(details=f"{self.pod_name}({self.host}) queued message: '{message}'")
+
+        self.gossip_message(request, sender_id, trace)
         return gossip_pb2.Acknowledgment(details=f"{self.pod_name}({self.host}) processed message: '{message}'")
 
+    def _is_duplicate(self, request, trace):
+        with trace.span('dedup'):
+            return self.received_messages.check_and_add_digest(request.message_id)
+
     # This function objective is to send message to all neighbor nodes.
     # In real environment, suppose we should get latency from
     # networking tools such as iperf. But it will be included in
     # future work. For the sake of this simulation, we will get
     # neighbor latency based by providing delay using the pre-defined
     # latency value. Formula: time.sleep(latency_ms/1000)
-    def gossip_message(self, message, sender_id):
-
-        # Get the neighbor and its latency
-        for neighbor_pod_name, neighbor_latency in self.neighbor_pods:
-            if neighbor_pod_name != sender_id:
-                neighbor_ip = self.get_pod_ip(neighbor_pod_name)
-                target = f"{neighbor_ip}:5050"
-
-                # Record the send timestamp
-                send_timestamp = time.time_ns()
-
-                # Introduce latency here
-                time.sleep(int(neighbor_latency) / 1000)
-
-                with grpc.insecure_channel(target) as channel:
-                    try:
-                        stub = gossip_pb2_grpc.GossipServiceStub(channel)
-                        stub.SendMessage(gossip_pb2.GossipMessage(
-                            message=message,
-                            sender_id=self.pod_name,
-                            timestamp=send_timestamp,
-                            latency_ms=neighbor_latency  # neighbor latency in miliseconds
-                        ))
-                        # print(
-                        #     f"{self.pod_name}({self.host}) forwarded message: '{message}' to {neighbor_pod_name} ({neighbor_ip}) "
-                        #     f"with latency {neighbor_latency} ms",
-                        #     flush=True)
-                    except grpc.RpcError as e:
-                        print(f"Failed to send message: '{message}' to {neighbor_pod_name}: {e}", flush=True)
+    def gossip_message(self, request, sender_id, trace=NULL_TRACE):
+
+        # Get the neighbors (and their latency) except the sender
+        targets = [(neighbor_pod_name, neighbor_latency)
+                   for neighbor_pod_name, neighbor_latency in self.neighbor_pods
+                   if neighbor_pod_name != sender_id]
+
+        # Messages being forwarded right now, many of them can go through the node at once
+        sessions = self.metrics.gauge('sessions_active')
+        sessions.inc()
+        try:
+            if self.fanout_mode == 'parallel' and self.scheduler:
+                sends = [self.scheduler.schedule(int(neighbor_latency) / 1000, self._deliver, request,
+                                                 neighbor_pod_name, neighbor_latency, time.time_ns(), trace)
+                         for neighbor_pod_name, neighbor_latency in targets]
+                futures.wait(sends)
+            elif self.fanout_mode == 'parallel':
+                self.fanout.broadcast(request, targets, trace)
+            else:
+                for neighbor_pod_name, neighbor_latency in targets:
+                    self._send_to_neighbor(request, neighbor_pod_name, neighbor_latency, trace)
+        finally:
+            sessions.dec()
+
+    def _send_to_neighbor(self, request, neighbor_pod_name, neighbor_latency, trace=NULL_TRACE):
+
+        # Record the send timestamp
+        send_timestamp = time.time_ns()
+
+        # Introduce latency here
+        time.sleep(int(neighbor_latency) / 1000)
+
+        self._deliver(request, neighbor_pod_name, neighbor_latency, send_timestamp, trace)
+
+    def _deliver(self, request, neighbor_pod_name, neighbor_latency, send_timestamp, trace=NULL_TRACE):
+        message = protocol.text(request)
+
+        # How far the emulated delay (sleep or timer) was from the edge latency
+        delivered_timestamp = time.time_ns()
+        trace.record('delay', send_timestamp, delivered_timestamp, neighbor=neighbor_pod_name,
+                     latency_ms=neighbor_latency)
+        delay_ms = (delivered_timestamp - send_timestamp) / 1e6
+        self.metrics.histogram('delay_error_ms').observe(delay_ms - float(neighbor_latency))
+
+        neighbor_ip = self.get_pod_ip(neighbor_pod_name)
+        if neighbor_ip is None:
+            print(f"Failed to send message: '{message}' to {neighbor_pod_name}: no ip address", flush=True)
+            return
+        target = f"{neighbor_ip}:5050"
+
+        forward = protocol.forward(
+            request,
+            sender_id=self.pod_name,
+            timestamp=send_timestamp,
+            latency_ms=neighbor_latency  # neighbor latency in miliseconds
+        )
+        send_start = time.perf_counter()
+        with trace.span('rpc', neighbor=neighbor_pod_name, transport=self.transport) as span:
+            sent = self._send(target, forward, neighbor_pod_name, trace, trace.metadata(span))
+        if sent:
+            self.metrics.counter('forwarded').inc()
+            self.metrics.histogram('send_latency_ms', neighbor=neighbor_pod_name).observe(
+                (time.perf_counter() - send_start) * 1000)
+        else:
+            self.metrics.counter('send_failed').inc()
 
+    def _send(self, target, forward, neighbor_pod_name, trace=NULL_TRACE, metadata=None):
+        """
+        Sends forward to target with the configured transport. False if it failed.
+        The trace metadata only travels with unary calls, streams and batches carry
+        the messages of many traces.
+        """
+        if self.transport == 'stream' and self._send_on_stream(target, forward):
+            return True
+        if self.transport == 'batch' and self._send_in_batch(target, forward):
+            return True
+        if self.send_queues is not None:
+            # Wait for the delivery like a direct call would, so the counters and sync
+            # propagation cover the whole send, retries included
+            return self.send_queues.submit(neighbor_pod_name, target, forward, metadata).result()
+
+        message = protocol.text(forward)
+        with trace.span('channel', neighbor=neighbor_pod_name):
+            stub = self.channels.get_stub(target)
+        try:
+            stub.SendMessage(forward, metadata=metadata, timeout=self.send_deadline)
+            # print(
+            #     f"{self.pod_name}({self.host}) forwarded message: '{message}' to {neighbor_pod_name} ({neighbor_ip}) "
+            #     f"with latency {neighbor_latency} ms",
+            #     flush=True)
+            return True
+        except grpc.RpcError as e:
+            self.channels.report_failure(target, e)
+            print(f"Failed to send message: '{message}' to {neighbor_pod_name}: {e}", flush=True)
+            return False
+
+    def _call_unary(self, target, forward, metadata=None, timeout=None):
+        """One SendMessage call of the send queues, failures are raised for their retries."""
+        try:
+            return self.channels.get_stub(target).SendMessage(forward, metadata=metadata, timeout=timeout)
+        except grpc.RpcError as e:
+            self.channels.report_failure(target, e)
+            raise
+
+    def _send_on_stream(self, target, forward):
+        """Sends over the stream of target and waits for its ack. False if the stream failed."""
+        try:
+            self.streams.send(target, forward).result(timeout=self.send_deadline)
+            return True
+        except futures.TimeoutError:
+            print(f"Stream to {target} timed out, sending unary instead", flush=True)
+            return False
+        except (grpc.RpcError, StreamClosed) as e:
+            print(f"Stream to {target} failed, sending unary instead: {e}", flush=True)
+            return False
+
+    def _send_in_batch(self, target, forward):
+        """Queues the message in the batch of target and waits for its ack. False if the batch failed."""
+        try:
+            self.batcher.add(target, forward).result(timeout=self.send_deadline)
+            return True
+        except futures.TimeoutError:
+            print(f"Batch to {target} timed out, sending unary instead", flush=True)
+            return False
+        except grpc.RpcError as e:
+            self.channels.report_failure(target, e)
+            print(f"Batch to {target} failed, sending unary instead: {e}", flush=True)
+            return False
+
+    def _send_batch(self, target, messages):
+        return self.channels.get_stub(target).SendBatch(gossip_pb2.GossipBatch(messages=messages),
+                                                        timeout=self.send_deadline)
+
+    # Same as SendMessage, for messages arriving on a neighbor's long-lived stream
+    def GossipStream(self, request_iterator, context):
+        for request in request_iterator:
+            yield self.SendMessage(request, context)
+
+    # Same as SendMessage, for every message of a coalesced batch
+    def SendBatch(self, request, context):
+        for message in request.messages:
+            self.SendMessage(message, context)
+        return gossip_pb2.Acknowledgment(details=f"{self.pod_name}({self.host}) processed {len(request.messages)} messages")
+
+    def GetStats(self, request, context):
+        return gossip_pb2.Stats(values=self.metrics.snapshot(), text=self.metrics.render())
+
+    def GetTraces(self, request, context):
+        spans = self.tracer.dump(clear=request.clear)
+        return gossip_pb2.TraceDump(spans=[gossip_pb2.Span(**span) for span in spans])
+
+    def _forward_complete(self, request, sender_id, elapsed_ms):
+        """Completion signal of the async mode, the forwards of this message have drained."""
+        message = protocol.text(request)
+        completed_timestamp = time.time_ns()
+        log_message = (f"{self.pod_name}({self.host}) forwarded: '{message}' from {sender_id}"
+                       f" to all neighbors in {elapsed_ms:.2f} ms ({self.forwarder.pending() - 1} still pending)")
+        self._log_event(message, sender_id, completed_timestamp, elapsed_ms, None, 'forwarded', log_message,
+                        request.hop_count)
 
     def _find_neighbors(self, node_id):
 
@@ -188,7 +518,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         Date and time : 8 Jan 2024 at 12:37 pm
         """
 
-        latency_option = f"{os.environ['LATENCY_OPTION']}"
+        latency_option = f"{self.config['LATENCY_OPTION']}"
 
         neighbors = []
         for edge in self.topology['edges']:
@@ -200,7 +530,8 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         return neighbors
 
 
-    def _log_event(self, message, sender_id, received_timestamp, propagation_time, latency_ms, event_type, log_message):
+    def _log_event(self, message, sender_id, received_timestamp, propagation_time, latency_ms, event_type, log_message,
+                   hop_count=None, trace=NULL_TRACE):
         """Logs the gossip event as structured JSON data."""
         event_data = {
             'message': message,
@@ -210,6 +541,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
             'propagation_time': propagation_time,
             'latency_ms': latency_ms,
             'event_type': event_type,
+            'hop_count': hop_count,
             'detail': log_message
         }
 
@@ -218,22 +550,115 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
 
         # Print both the log message and the JSON data to the console
         # print(log_message, flush=True)
-        print(json.dumps(event_data), flush=True)
+        # print(json.dumps(event_data), flush=True)
+        with trace.span('log', event_type=event_type):
+            self.event_logger.log(event_data)
 
     def start_server(self):
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        # Every open GossipStream keeps one worker busy, so the stream transport needs
+        # at least as many workers as neighbors (SERVER_WORKERS in helm values)
+        # The pool measures handler queueing time and busy workers for the metrics
+        # SO_REUSEPORT lets the worker processes of a multi-process node bind the same port,
+        # the kernel spreads the incoming connections over them
+        server = grpc.server(InstrumentedThreadPoolExecutor(int(self.config.get('SERVER_WORKERS', '10')), self.metrics),
+                             options=SERVER_KEEPALIVE_OPTIONS + [('grpc.so_reuseport', 1)])
         # server = grpc.server(futures.ThreadPoolExecutor(max_workers=20))
         gossip_pb2_grpc.add_GossipServiceServicer_to_server(self, server)
+        self.health = self._add_health_service(server)
+        self._set_serving(False)
         server.add_insecure_port(f'[::]:{self.port}')
         print(f"{self.pod_name}({self.host}) listening on port {self.port}", flush=True)
         server.start()
+        start_http_server(self.metrics, self.metrics_port)
+        print(f"{self.pod_name}({self.host}) metrics on port {self.metrics_port}", flush=True)
+        self._startup_phase('bind')
+
+        # Resolve the neighbor IPs (waiting for the ones not scheduled yet),
+        # then keep them up to date from a pod watch
+        neighbors = [neighbor for neighbor, _ in self.neighbor_pods]
+        self.resolver.resolve_all(neighbors)
+        self.resolver.start_watch()
+        unresolved = self.resolver.wait_for(neighbors, timeout=float(self.config.get('STARTUP_RESOLVE_TIMEOUT', '120')))
+        if unresolved:
+            print(f"{self.pod_name}({self.host}) serving without the ips of {unresolved}", flush=True)
+        neighbor_ips = {neighbor: self.resolver.resolve(neighbor) for neighbor in neighbors}
+        print(f"{self.pod_name}({self.host}) neighbor ips: {neighbor_ips}", flush=True)
+        self._startup_phase('resolve')
+
+        # Ready from here on (readinessProbe)
+        self._set_serving(True)
+        phases = ", ".join(f"{phase}={elapsed_ms:.1f} ms" for phase, elapsed_ms in self.startup.items())
+        print(f"{self.pod_name}({self.host}) serving {(time.perf_counter() - PROCESS_START) * 1000:.1f} ms "
+              f"after process start ({phases})", flush=True)
+
+        # Pod termination, stop taking messages and write the events still queued
+        def stop(signum, frame):
+            self._set_serving(False)
+            server.stop(grace=5)
+
+        signal.signal(signal.SIGTERM, stop)
         server.wait_for_termination()
+        self.event_logger.close()
+        self.tracer.close()
+
+    def _add_health_service(self, server):
+        """grpc.health.v1 service reporting NOT_SERVING until the neighbors are resolved. None if not installed."""
+        try:
+            from grpc_health.v1 import health, health_pb2_grpc
+        except ImportError:
+            print("grpcio-health-checking is not installed, no health service", flush=True)
+            return None
+        servicer = health.HealthServicer()
+        health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+        return servicer
+
+    def _set_serving(self, serving):
+        if self.health is None:
+            return
+        from grpc_health.v1 import health_pb2
+        status = health_pb2.HealthCheckResponse.SERVING if serving else health_pb2.HealthCheckResponse.NOT_SERVING
+        # '' is the overall health asked by the kubelet's grpc probe
+        for service in ('', 'gossip.GossipService'):
+            self.health.set(service, status)
+
+
+def run_worker(service_name, worker_id, received_messages):
+    node = Node(service_name, worker_id=worker_id, received_messages=received_messages)
+    node.start_server()
 
 
 def run_server():
-    service_name = os.getenv('SERVICE_NAME', 'bcgossip')
-    node = Node(service_name)
-    node.start_server()
+    service_name = os.getenv('SERVICE_NAME', 'bcgossip-svc')
+
+    # Worker processes of the node (from helm values), 1 - single process
+    # Handlers are GIL-bound, so more processes use more cores of the pod. They share
+    # port 5050 (SO_REUSEPORT) and one dedup table in shared memory, created before the
+    # fork, and no gRPC object may exist in this process before the fork
+    processes = int(os.getenv('SERVER_PROCESSES', '1'))
+    if processes <= 1:
+        node = Node(service_name)
+        node.start_server()
+        return
+
+    context = multiprocessing.get_context('fork')
+    received_messages = SharedDedupTable(capacity=int(os.getenv('DEDUP_CAPACITY', '100000')),
+                                         ttl=float(os.getenv('DEDUP_TTL', '3600')), context=context)
+    workers = [context.Process(target=run_worker, args=(service_name, worker_id, received_messages),
+                               name=f"node-worker-{worker_id}")
+               for worker_id in range(processes)]
+    for worker in workers:
+        worker.start()
+    print(f"Started {processes} node worker processes", flush=True)
+
+    # Pod termination, pass it on to the workers (each one drains its own server)
+    def stop(signum, frame):
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    for worker in workers:
+        worker.join()
+        print(f"Node worker {worker.name} exited with {worker.exitcode}", flush=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,72 @@
+import gossip_pb2
+from dedup import message_digest
+
+# Version 1 - message, sender_id, timestamp and latency_ms only (dedup on the message string)
+# Version 2 - adds message_id, origin_id, origin_timestamp, hop_count, ttl and a bytes payload
+PROTOCOL_VERSION = 2
+
+
+def new_message(payload, origin_id, origin_timestamp, ttl=0):
+    """Builds a version 2 message at its origin. The message id is the SHA-256 of the payload."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return gossip_pb2.GossipMessage(
+        version=PROTOCOL_VERSION,
+        message_id=message_digest(payload),
+        origin_id=origin_id,
+        origin_timestamp=origin_timestamp,
+        hop_count=0,
+        ttl=ttl,
+        payload=payload,
+        sender_id=origin_id,
+        timestamp=origin_timestamp,
+    )
+
+
+def upgrade(request, ttl=0):
+    """
+    Compatibility shim for version 1 senders (e.g. an old start.py).
+
+    Fills the version 2 fields of a message that only carries `message`, so the node
+    can handle every message the same way. The id is derived from the message
+    string, the sender is taken as the origin. Version 2 messages are returned as is.
+    """
+    if request.version >= PROTOCOL_VERSION:
+        return request
+
+    payload = request.message.encode('utf-8')
+    request.version = PROTOCOL_VERSION
+    request.message_id = message_digest(payload)
+    request.origin_id = request.sender_id
+    request.origin_timestamp = request.timestamp
+    request.hop_count = 0
+    request.ttl = ttl
+    request.payload = payload
+    request.message = ""
+    return request
+
+
+def forward(request, sender_id, timestamp, latency_ms):
+    """The copy of request sent on to a neighbor, one hop further."""
+    return gossip_pb2.GossipMessage(
+        version=PROTOCOL_VERSION,
+        message_id=request.message_id,
+        origin_id=request.origin_id,
+        origin_timestamp=request.origin_timestamp,
+        hop_count=request.hop_count + 1,
+        ttl=request.ttl,
+        payload=request.payload,
+        sender_id=sender_id,
+        timestamp=timestamp,
+        latency_ms=latency_ms,
+    )
+
+
+def expired(request):
+    """True if the message has used up its hops and must not be forwarded any further."""
+    return request.ttl > 0 and request.hop_count >= request.ttl
+
+
+def text(request):
+    """The payload as text, as it is written to the logs ('message' field)."""
+    return request.payload.decode('utf-8', errors='replace')
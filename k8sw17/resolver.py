@@ -0,0 +1,151 @@
+import socket
+import threading
+import time
+
+
+class PeerResolver:
+    """
+    Resolves neighbor pod names to pod IPs once and keeps them in a cache.
+
+    At startup every pod with the app label is listed with a single API call.
+    After that, one watch on the same label keeps the cache up to date, so a
+    rescheduled pod is picked up with its new IP without asking the API server
+    on every message. Names that are not (yet) in the cache fall back to the
+    headless service DNS name <pod>.<service>.<namespace>.svc.cluster.local.
+
+    api (CoreV1Api-like), watch_factory (kubernetes.watch.Watch-like) and
+    dns_lookup can be replaced by fakes to run it without a cluster.
+    """
+
+    def __init__(self, namespace="default", label_selector="app=bcgossip", service_name="bcgossip-svc",
+                 api=None, watch_factory=None, dns_lookup=socket.gethostbyname, retry_interval=1.0):
+        self.namespace = namespace
+        self.label_selector = label_selector
+        self.service_name = service_name
+        self.api = api
+        self.watch_factory = watch_factory
+        self.dns_lookup = dns_lookup
+        self.retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._cache = {}  # pod name -> pod ip
+        self._resource_version = None
+        self._stop = threading.Event()
+        self._watch_thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.dns_lookups = 0
+        self.watch_updates = 0
+
+    def _connect(self):
+        """Creates the in-cluster API client, unless a (fake) one was given."""
+        if self.api is None:
+            from kubernetes import client, config
+            config.load_incluster_config()
+            self.api = client.CoreV1Api()
+        if self.watch_factory is None:
+            from kubernetes import watch
+            self.watch_factory = watch.Watch
+
+    def resolve_all(self, pod_names):
+        """Resolves all neighbors at once (one list call), the rest through DNS."""
+        try:
+            self._list_pods()
+        except Exception as e:
+            print(f"Failed to list pods with {self.label_selector}: {e}", flush=True)
+
+        resolved = {}
+        for pod_name in pod_names:
+            resolved[pod_name] = self.resolve(pod_name)
+        return resolved
+
+    def resolve(self, pod_name):
+        """Returns the IP of pod_name from the cache, or from DNS. None if it can't be resolved."""
+        with self._lock:
+            pod_ip = self._cache.get(pod_name)
+            if pod_ip:
+                self.hits += 1
+                return pod_ip
+            self.misses += 1
+
+        pod_ip = self._resolve_dns(pod_name)
+        if pod_ip:
+            with self._lock:
+                self._cache.setdefault(pod_name, pod_ip)
+        return pod_ip
+
+    def wait_for(self, pod_names, timeout=120.0):
+        """Waits until every pod name resolves or timeout seconds. Returns the ones still unresolved."""
+        deadline = time.monotonic() + timeout
+        pending = list(pod_names)
+        while True:
+            pending = [pod_name for pod_name in pending if not self.resolve(pod_name)]
+            if not pending or time.monotonic() >= deadline:
+                return pending
+            time.sleep(self.retry_interval)
+
+    def start_watch(self):
+        """Keeps the cache up to date from a single watch on the app label."""
+        if self._watch_thread is None:
+            self._watch_thread = threading.Thread(target=self._watch, name="pod-watch", daemon=True)
+            self._watch_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {'resolver_cached': len(self._cache), 'resolver_hits': self.hits,
+                    'resolver_misses': self.misses, 'resolver_dns_lookups': self.dns_lookups,
+                    'resolver_watch_updates': self.watch_updates}
+
+    def _list_pods(self):
+        self._connect()
+        pods = self.api.list_namespaced_pod(namespace=self.namespace, label_selector=self.label_selector)
+        with self._lock:
+            for pod in pods.items:
+                if pod.status.pod_ip:
+                    self._cache[pod.metadata.name] = pod.status.pod_ip
+            self._resource_version = pods.metadata.resource_version
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self._connect()
+                stream = self.watch_factory().stream(self.api.list_namespaced_pod,
+                                                     namespace=self.namespace,
+                                                     label_selector=self.label_selector,
+                                                     resource_version=self._resource_version,
+                                                     timeout_seconds=300)
+                for event in stream:
+                    self._apply(event['type'], event['object'])
+                    if self._stop.is_set():
+                        break
+            except Exception as e:
+                # Most likely an expired resource version (410 Gone), start again from a fresh list
+                print(f"Pod watch interrupted: {e}", flush=True)
+                time.sleep(self.retry_interval)
+                try:
+                    self._list_pods()
+                except Exception as e:
+                    print(f"Failed to list pods with {self.label_selector}: {e}", flush=True)
+
+    def _apply(self, event_type, pod):
+        with self._lock:
+            self._resource_version = pod.metadata.resource_version
+            if event_type == 'DELETED' or not pod.status.pod_ip:
+                self._cache.pop(pod.metadata.name, None)
+            else:
+                self._cache[pod.metadata.name] = pod.status.pod_ip
+            self.watch_updates += 1
+
+    def _resolve_dns(self, pod_name):
+        hostname = f"{pod_name}.{self.service_name}.{self.namespace}.svc.cluster.local"
+        with self._lock:
+            self.dns_lookups += 1
+        try:
+            return self.dns_lookup(hostname)
+        except OSError as e:
+            print(f"Failed to resolve {hostname}: {e}", flush=True)
+            return None
@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent import futures
+
+
+class DelayScheduler:
+    """
+    Timer-based scheduler for the emulated link latency.
+
+    Instead of sleeping on a worker thread, a delayed send is pushed on a heap
+    ordered by its due time. A single dispatcher thread waits for the earliest one
+    and only then hands it over to the executor (the sender pool), so pending sends
+    don't hold any worker while they wait.
+
+    The difference between the due time and the time a send actually starts is
+    recorded as scheduling jitter (see stats()), and a summary is printed every
+    report_interval seconds while there is traffic.
+    """
+
+    def __init__(self, executor, report_interval=10.0, max_samples=10000):
+        self.executor = executor
+        self.report_interval = report_interval
+
+        self._heap = []
+        self._sequence = itertools.count()  # tie breaker for sends due at the same time
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        self._stats_lock = threading.Lock()
+        self._jitter_samples = deque(maxlen=max_samples)
+        self.dispatched = 0
+        self.jitter_max_ms = 0.0
+        self.jitter_total_ms = 0.0
+        self._last_report = time.monotonic()
+        self._last_report_count = 0
+
+        self._thread = threading.Thread(target=self._run, name="delay-scheduler", daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay_s, fn, *args):
+        """Runs fn(*args) on the executor after delay_s seconds. Returns a Future of its result."""
+        future = futures.Future()
+        due = time.monotonic() + delay_s
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), future, fn, args))
+            # Wake the dispatcher up only if this send is now the earliest one
+            if self._heap[0][2] is future:
+                self._condition.notify()
+        return future
+
+    def pending(self):
+        with self._condition:
+            return len(self._heap)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def stats(self):
+        pending = self.pending()
+        with self._stats_lock:
+            samples = sorted(self._jitter_samples)
+            count = self.dispatched
+            return {
+                'scheduled_pending': pending,
+                'scheduled_dispatched': count,
+                'jitter_mean_ms': self.jitter_total_ms / count if count else 0.0,
+                'jitter_p50_ms': samples[len(samples) // 2] if samples else 0.0,
+                'jitter_p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0,
+                'jitter_max_ms': self.jitter_max_ms,
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else self.report_interval
+                    self._condition.wait(min(timeout, self.report_interval))
+                    self._maybe_report()
+                if self._stopped:
+                    break
+                due, _, future, fn, args = heapq.heappop(self._heap)
+
+            self.executor.submit(self._dispatch, due, future, fn, args)
+            self._maybe_report()
+
+    def _dispatch(self, due, future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        jitter_ms = (time.monotonic() - due) * 1000
+        with self._stats_lock:
+            self._jitter_samples.append(jitter_ms)
+            self.dispatched += 1
+            self.jitter_total_ms += jitter_ms
+            self.jitter_max_ms = max(self.jitter_max_ms, jitter_ms)
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        if self.dispatched == self._last_report_count:
+            return
+        self._last_report_count = self.dispatched
+        summary = ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in self.stats().items())
+        print(f"Latency scheduler: {summary}", flush=True)
@@ -0,0 +1,183 @@
+import queue
+import random
+import threading
+import time
+from concurrent import futures
+import grpc
+
+# Status codes worth another attempt, the neighbor may be slow or restarting
+RETRY_CODES = (grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.UNAVAILABLE)
+
+
+class CircuitBreaker:
+    """
+    Skips a neighbor that keeps failing.
+
+    After failure_threshold failed sends in a row the breaker opens and allow()
+    is False for reset_timeout seconds. Then one send is let through (half open),
+    its success closes the breaker again, its failure opens it for another
+    reset_timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self.opened = 0
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def cooling_down(self):
+        """Open and still within reset_timeout, without taking the half open trial like allow()."""
+        with self._lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._trial = False
+                self.opened += 1
+
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+
+class NeighborQueues:
+    """
+    Bounded outbound queue per neighbor, each drained by its own worker thread.
+
+    submit() puts a send on the neighbor's queue and returns a Future of its
+    delivery right away, so one slow or hung neighbor only holds up its own queue
+    and whoever waits for that Future. The Future resolves True once the neighbor
+    acknowledged, False when the send failed, was dropped or skipped. When the
+    queue is full submit() waits up to deadline (enqueue_timeout without one) for
+    room and then drops and counts the send. The worker
+    calls send_fn(*args, timeout=deadline) and retries DEADLINE_EXCEEDED and
+    UNAVAILABLE up to max_retries times, with exponential backoff and jitter.
+    Every neighbor has a CircuitBreaker, sends to an open one are skipped, both
+    new ones and the ones still queued when it opened.
+    """
+
+    def __init__(self, send_fn, max_queue=1000, deadline=5.0, max_retries=3, backoff_base=0.1,
+                 backoff_max=2.0, breaker_threshold=5, breaker_reset=10.0, enqueue_timeout=1.0):
+        self.send_fn = send_fn
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.enqueue_timeout = deadline or enqueue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+
+        self._lock = threading.Lock()
+        self._queues = {}    # neighbor -> queue.Queue
+        self._breakers = {}  # neighbor -> CircuitBreaker
+        self._stopped = False
+
+        self.sent = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def submit(self, neighbor, *args):
+        """Queues send_fn(*args) for neighbor. Returns the Future of the delivery (True - acknowledged)."""
+        delivered = futures.Future()
+        send_queue, breaker = self._get(neighbor)
+        if breaker.cooling_down():
+            self._count('skipped')
+            delivered.set_result(False)
+            return delivered
+        try:
+            send_queue.put((args, delivered), timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('dropped')
+            print(f"Send queue of {neighbor} is full ({self.max_queue}), message dropped", flush=True)
+            delivered.set_result(False)
+        return delivered
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            queues = list(self._queues.values())
+        for send_queue in queues:
+            send_queue.put(None)
+
+    def stats(self):
+        with self._lock:
+            depths = [send_queue.qsize() for send_queue in self._queues.values()]
+            breakers_open = sum(1 for breaker in self._breakers.values() if breaker.is_open())
+            return {'send_queue_depth': sum(depths), 'send_queue_max_depth': max(depths, default=0),
+                    'send_sent': self.sent, 'send_failed': self.failed, 'send_timeouts': self.timeouts,
+                    'send_retries': self.retries, 'send_dropped': self.dropped,
+                    'send_breaker_skipped': self.skipped, 'send_breakers_open': breakers_open}
+
+    def _get(self, neighbor):
+        with self._lock:
+            if neighbor not in self._queues:
+                self._queues[neighbor] = queue.Queue(maxsize=self.max_queue)
+                self._breakers[neighbor] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                threading.Thread(target=self._run, args=(neighbor,), name=f"send-{neighbor}", daemon=True).start()
+            return self._queues[neighbor], self._breakers[neighbor]
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _run(self, neighbor):
+        send_queue, breaker = self._get(neighbor)
+        while True:
+            item = send_queue.get()
+            if item is None:
+                break
+            args, delivered = item
+            if not breaker.allow():
+                self._count('skipped')
+                delivered.set_result(False)
+                continue
+            sent = self._send(neighbor, args)
+            if sent:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            delivered.set_result(sent)
+
+    def _send(self, neighbor, args):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.send_fn(*args, timeout=self.deadline)
+                self._count('sent')
+                return True
+            except grpc.RpcError as e:
+                code = e.code() if hasattr(e, 'code') else None
+                if code == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    self._count('timeouts')
+                if code not in RETRY_CODES or attempt == self.max_retries or self._stopped:
+                    self._count('failed')
+                    print(f"Failed to send to {neighbor} after {attempt + 1} attempts: {code}", flush=True)
+                    return False
+                self._count('retries')
+                backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                time.sleep(backoff * random.uniform(0.5, 1.0))
+        return False
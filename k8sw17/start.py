@@ -2,13 +2,15 @@ import grpc
 import argparse
 import time
 import socket
-import gossip_pb2
+import threading
 import gossip_pb2_grpc
-from kubernetes import client, config
+import protocol
 
 
 def get_pod_ip(pod_name, namespace="default"):
     """Fetches the IP address of a pod in the specified namespace."""
+    # Imported here, the kubernetes client takes most of the start-up time of this script
+    from kubernetes import client, config
     config.load_incluster_config()
     v1 = client.CoreV1Api()
     pod = v1.read_namespaced_pod(name=pod_name, namespace=namespace)
@@ -28,16 +30,93 @@ def send_message_to_self(message):
     with grpc.insecure_channel(target) as channel:
         stub = gossip_pb2_grpc.GossipServiceStub(channel)
         print(f"Sending message to self ({pod_name}, {pod_ip}): '{message}' with latency={target_latency} ms", flush=True)
-        response = stub.SendMessage(gossip_pb2.GossipMessage(
-            message=message,
-            sender_id=pod_name,
-            timestamp=time.time_ns(),
-            latency_ms=target_latency
-        ))
+        request = protocol.new_message(message, origin_id=pod_name, origin_timestamp=time.time_ns())
+        request.latency_ms = target_latency
+        response = stub.SendMessage(request)
         print(f"Received acknowledgment: {response.details}", flush=True)
 
+def generate_load(pod_names, rate, duration, prefix, max_inflight=100, timeout=60):
+    """
+    Load generator: initiates rate messages per second for duration seconds,
+    round robin from the given pods (each one is the origin of its messages).
+
+    Messages are sent without waiting for their acks (at most max_inflight at a
+    time), so many of them propagate through the network at once. Prints the
+    offered and acknowledged throughput and the ack latency percentiles.
+    """
+    stubs = []
+    channels = []
+    for pod_name in pod_names:
+        pod_ip = get_pod_ip(pod_name)
+        channel = grpc.insecure_channel(f"{pod_ip}:5050")
+        channels.append(channel)
+        stubs.append((pod_name, gossip_pb2_grpc.GossipServiceStub(channel)))
+        print(f"Origin {pod_name} ({pod_ip})", flush=True)
+
+    inflight = threading.BoundedSemaphore(max_inflight)
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def done(future, started):
+        try:
+            future.result()
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+        except grpc.RpcError as e:
+            with lock:
+                errors.append(e.code())
+        finally:
+            inflight.release()
+
+    total = int(rate * duration)
+    print(f"Sending {total} messages at {rate}/s from {len(stubs)} pods", flush=True)
+    start = time.perf_counter()
+    for i in range(total):
+        # Pace the messages, the i-th one is due at i / rate
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pod_name, stub = stubs[i % len(stubs)]
+        request = protocol.new_message(f"{prefix}-{pod_name}-{i}", origin_id=pod_name, origin_timestamp=time.time_ns())
+        request.latency_ms = 0.00
+        inflight.acquire()
+        started = time.perf_counter()
+        future = stub.SendMessage.future(request, timeout=timeout)
+        future.add_done_callback(lambda f, started=started: done(f, started))
+    sent_elapsed = time.perf_counter() - start
+
+    # Wait for the last acks
+    for _ in range(max_inflight):
+        inflight.acquire()
+    elapsed = time.perf_counter() - start
+    for channel in channels:
+        channel.close()
+
+    latencies.sort()
+    print(f"Sent {total} messages in {sent_elapsed:.2f}s ({total / sent_elapsed:.1f} msgs/sec offered)", flush=True)
+    print(f"Acknowledged {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} msgs/sec), "
+          f"{len(errors)} errors", flush=True)
+    if latencies:
+        print(f"Ack latency p50={latencies[len(latencies) // 2]:.1f} ms "
+              f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f} ms "
+              f"max={latencies[-1]:.1f} ms", flush=True)
+    print("Load complete.", flush=True)
+
+
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description="Send a message to self (the current pod).")
-    parser.add_argument('--message', required=True, help="Message to send")
+    parser = argparse.ArgumentParser(description="Send a message to self (the current pod), or generate load "
+                                                 "with --rate (messages per second).")
+    parser.add_argument('--message', default='', help="Message to send (prefix of the messages with --rate)")
+    parser.add_argument('--rate', type=float, default=0, help="Messages per second (0 - send one message)")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of load")
+    parser.add_argument('--pods', nargs='*', help="Origin pods of the load (default: this pod)")
+    parser.add_argument('--max_inflight', type=int, default=100, help="Messages waiting for their ack at most")
     args = parser.parse_args()
-    send_message_to_self(args.message)
\ No newline at end of file
+    if args.rate > 0:
+        generate_load(args.pods or [socket.gethostname()], args.rate, args.duration,
+                      args.message or f"load-{int(time.time())}", max_inflight=args.max_inflight)
+    elif args.message:
+        send_message_to_self(args.message)
+    else:
+        parser.error("--message or --rate is required")
\ No newline at end of file
@@ -0,0 +1,104 @@
+import queue
+import threading
+from collections import deque
+from concurrent import futures
+
+
+class StreamClosed(Exception):
+    """The stream to a neighbor has ended, the message should be sent unary instead."""
+
+
+class NeighborStream:
+    """
+    One long-lived GossipStream (bidirectional) call to a neighbor.
+
+    Messages are pushed on the request side of the stream as they come, the
+    neighbor answers every message with one Acknowledgment in the same order.
+    send() returns a Future that resolves with that acknowledgment. When the
+    stream breaks, every pending future fails with the error and the stream
+    is marked broken, so StreamPool opens a new one for the next message.
+    """
+
+    def __init__(self, stub, target):
+        self.target = target
+        self.broken = False
+
+        self._requests = queue.Queue()
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+        self._responses = stub.GossipStream(self._request_iterator())
+        self._reader = threading.Thread(target=self._read, name=f"stream-{target}", daemon=True)
+        self._reader.start()
+
+    def send(self, request):
+        future = futures.Future()
+        with self._lock:
+            if self.broken:
+                raise StreamClosed(f"stream to {self.target} is closed")
+            # Queued under the lock, so acknowledgments match the order of _pending
+            self._pending.append(future)
+            self._requests.put(request)
+        return future
+
+    def close(self):
+        self._requests.put(None)
+
+    def _request_iterator(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            yield request
+
+    def _read(self):
+        error = StreamClosed(f"stream to {self.target} ended")
+        try:
+            for ack in self._responses:
+                with self._lock:
+                    future = self._pending.popleft()
+                future.set_result(ack)
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            self.broken = True
+            pending = list(self._pending)
+            self._pending.clear()
+        self.close()
+        for future in pending:
+            future.set_exception(error)
+
+
+class StreamPool:
+    """Keeps one NeighborStream per neighbor target, on top of the channels of a ChannelPool."""
+
+    def __init__(self, channels):
+        self.channels = channels
+        self._lock = threading.Lock()
+        self._streams = {}
+        self.opened = 0
+        self.sent = 0
+
+    def send(self, target, request):
+        """Sends request over the stream of target. Returns a Future of its acknowledgment."""
+        with self._lock:
+            stream = self._streams.get(target)
+            if stream is None or stream.broken:
+                stream = NeighborStream(self.channels.get_stub(target), target)
+                self._streams[target] = stream
+                self.opened += 1
+            self.sent += 1
+        return stream.send(request)
+
+    def close(self):
+        with self._lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.close()
+
+    def stats(self):
+        with self._lock:
+            return {'streams_open': sum(1 for stream in self._streams.values() if not stream.broken),
+                    'streams_opened': self.opened, 'stream_messages': self.sent}
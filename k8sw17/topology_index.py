@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+
+# Compiler and reader of the topology index.
+#
+# Every pod used to list the topology folder, json.load the whole graph and scan
+# every edge for its own neighbors. The compiler turns each topology/*.json and
+# topology_kmeans/*.json into a compact CSR (compressed sparse row) file, and
+# writes a manifest keyed by CLUSTER/NODES/MODEL. A node then maps its file and
+# reads only its own adjacency row.
+#
+# python topology_index.py            (done in the Dockerfile, writes topology_index/)
+#
+# File layout, little-endian:
+#   header   magic 'GTPX', version, num_attrs, num_nodes, num_entries, names_bytes
+#   attrs    num_attrs x (15-byte edge attribute name, 1-byte type 'q' or 'd')
+#   names    node ids in row order, '\n' separated (names_bytes)
+#   offsets  num_nodes + 1 uint32, row i is entries offsets[i]..offsets[i+1]
+#   targets  num_entries uint32, row of the neighbor
+#   weights  num_attrs columns of num_entries int64/float64 values
+# An undirected edge appears in the rows of both of its nodes, each row in the
+# order of the edges in the JSON (same neighbor order as Node._find_neighbors).
+
+MAGIC = b'GTPX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIII')
+ATTR = struct.Struct('<15sc')
+
+INDEX_DIR = "topology_index"
+MANIFEST = "manifest.json"
+TOPOLOGY_FOLDERS = {'0': "topology", '1': "topology_kmeans"}
+
+# nodes300_Feb092025140642_BA2.json, kmeans_nodes300_Feb092025140642_BA2_k3.json
+FILENAME_PATTERN = re.compile(r'^(?:kmeans_)?nodes(\d+)_[^_]+_([A-Za-z]+)')
+
+
+def manifest_key(cluster, total_nodes, model):
+    return f"{cluster}/{total_nodes}/{model}"
+
+
+def file_hash(path):
+    """sha256 of the file content (hex)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_topology(topology, out_path):
+    """Writes the CSR index of a topology (the JSON dict) to out_path."""
+    names = [node['id'] for node in topology['nodes']]
+    rows = {name: i for i, name in enumerate(names)}
+
+    attrs = []
+    for edge in topology['edges']:
+        for key, value in edge.items():
+            if key not in ('source', 'target') and key not in attrs and isinstance(value, (int, float)):
+                attrs.append(key)
+    types = [b'q' if all(isinstance(edge.get(key, 0), int) for edge in topology['edges']) else b'd'
+             for key in attrs]
+
+    adjacency = [[] for _ in names]
+    for edge in topology['edges']:
+        adjacency[rows[edge['source']]].append((rows[edge['target']], edge))
+        adjacency[rows[edge['target']]].append((rows[edge['source']], edge))
+
+    offsets = array('I', [0])
+    targets = array('I')
+    for row in adjacency:
+        targets.extend(target for target, _ in row)
+        offsets.append(len(targets))
+    columns = [array(type_code.decode(), (edge.get(key, 0) for row in adjacency for _, edge in row))
+               for key, type_code in zip(attrs, types)]
+
+    names_blob = "\n".join(names).encode('utf-8')
+    with open(out_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(attrs), len(names), len(targets), len(names_blob)))
+        for key, type_code in zip(attrs, types):
+            f.write(ATTR.pack(key.encode('ascii'), type_code))
+        f.write(names_blob)
+        for values in [offsets, targets] + columns:
+            f.write(values.tobytes())
+
+
+def select_files(cluster, model, target_filename='', base_dir='.'):
+    """Topology files of the CLUSTER folders ('all' - both), filtered like automate.py by model or target_filename."""
+    clusters = TOPOLOGY_FOLDERS if cluster == 'all' else {cluster: TOPOLOGY_FOLDERS[cluster]}
+    files = []
+    for folder in clusters.values():
+        directory = os.path.join(base_dir, folder)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            if (target_filename and filename == target_filename) or (not target_filename and model in filename):
+                files.append(os.path.join(directory, filename))
+    return files
+
+
+def compile_all(base_dir=".", out_dir=INDEX_DIR):
+    """Compiles every topology file of the topology folders and writes the manifest."""
+    os.makedirs(os.path.join(base_dir, out_dir), exist_ok=True)
+    manifest = {}
+    for cluster, folder in TOPOLOGY_FOLDERS.items():
+        folder_path = os.path.join(base_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in sorted(os.listdir(folder_path)):
+            match = FILENAME_PATTERN.match(filename)
+            if not match or not filename.endswith('.json'):
+                continue
+            key = manifest_key(cluster, match.group(1), match.group(2))
+            if key in manifest:
+                print(f"Skipping {filename}, {key} is already {manifest[key]['source']}", flush=True)
+                continue
+
+            source = os.path.join(folder, filename)
+            with open(os.path.join(base_dir, source), 'r') as f:
+                topology = json.load(f)
+            index_file = filename[:-len('.json')] + '.idx'
+            compile_topology(topology, os.path.join(base_dir, out_dir, index_file))
+            manifest[key] = {'file': index_file, 'source': source,
+                             'source_size': os.path.getsize(os.path.join(base_dir, source)),
+                             'source_sha256': file_hash(os.path.join(base_dir, source)),
+                             'total_nodes': len(topology['nodes']), 'total_edges': len(topology['edges'])}
+            print(f"{key}: {source} -> {out_dir}/{index_file}", flush=True)
+
+    with open(os.path.join(base_dir, out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+class TopologyIndex:
+    """Read-only, memory-mapped CSR index of one topology."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_attrs, self.num_nodes, self.num_entries, names_bytes = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a topology index (version {VERSION})")
+
+        position = HEADER.size
+        self.attrs = {}  # name -> (type code, column offset)
+        attr_types = []
+        for _ in range(num_attrs):
+            name, type_code = ATTR.unpack_from(self._mm, position)
+            attr_types.append((name.rstrip(b'\0').decode('ascii'), type_code.decode()))
+            position += ATTR.size
+
+        self.names = self._mm[position:position + names_bytes].decode('utf-8').split("\n")
+        self.rows = {name: i for i, name in enumerate(self.names)}
+        position += names_bytes
+
+        self._offsets = position
+        self._targets = self._offsets + 4 * (self.num_nodes + 1)
+        position = self._targets + 4 * self.num_entries
+        for name, type_code in attr_types:
+            self.attrs[name] = (type_code, position)
+            position += 8 * self.num_entries
+
+    def neighbors(self, node_id, attr):
+        """(neighbor id, attr value) of node_id, read from its row only."""
+        row = self.rows[node_id]
+        start, end = struct.unpack_from('<II', self._mm, self._offsets + 4 * row)
+        degree = end - start
+        targets = struct.unpack_from(f'<{degree}I', self._mm, self._targets + 4 * start)
+        type_code, column = self.attrs[attr]
+        values = struct.unpack_from(f'<{degree}{type_code}', self._mm, column + 8 * start)
+        return [(self.names[target], value) for target, value in zip(targets, values)]
+
+    def close(self):
+        self._mm.close()
+
+
+def lookup_neighbors(cluster, total_nodes, model, node_id, attr, base_dir=".", index_dir=INDEX_DIR):
+    """
+    Neighbors of node_id from the compiled index of the CLUSTER/NODES/MODEL topology,
+    None when there is no (up to date) index for it.
+    """
+    try:
+        with open(os.path.join(base_dir, index_dir, MANIFEST), 'r') as f:
+            entry = json.load(f).get(manifest_key(cluster, total_nodes, model))
+    except FileNotFoundError:
+        return None
+    if entry is None:
+        return None
+
+    # The topology JSON changed after compiling, the index is out of date. The size
+    # rules most changes out without reading the file, an edit of the same size
+    # (another weight or neighbor id) only shows in the content hash
+    source = os.path.join(base_dir, entry['source'])
+    if os.path.exists(source) and (os.path.getsize(source) != entry['source_size']
+                                   or file_hash(source) != entry.get('source_sha256')):
+        print(f"Topology index of {entry['source']} is out of date", flush=True)
+        return None
+
+    index = TopologyIndex(os.path.join(base_dir, index_dir, entry['file']))
+    try:
+        print(f"topology_index: {entry['file']} (from {entry['source']})", flush=True)
+        return index.neighbors(node_id, attr)
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python topology_index.py [--out topology_index]")
+    parser.add_argument('--base_dir', default='.', help="Folder with the topology and topology_kmeans folders")
+    parser.add_argument('--out', default=INDEX_DIR, help="Output folder (relative to base_dir)")
+    args = parser.parse_args()
+    compile_all(args.base_dir, args.out)
@@ -0,0 +1,169 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+
+# gRPC metadata key of the span context, "<trace id>-<parent span id>"
+TRACE_METADATA_KEY = 'x-gossip-trace'
+
+
+def _new_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+class _NullSpan:
+    span_id = ''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullTrace:
+    """Trace of a message that is not sampled, records nothing."""
+
+    sampled = False
+
+    def span(self, name, parent_id=None, **attributes):
+        return _NULL_SPAN
+
+    def record(self, name, start_ns, end_ns, parent_id=None, span_id=None, **attributes):
+        pass
+
+    def metadata(self, span):
+        return None
+
+    def end(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACE = NullTrace()
+
+
+class _Span:
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.attributes['error'] = type(exc).__name__
+        self.trace.record(self.name, self.start_ns, time.time_ns(), parent_id=self.parent_id,
+                          span_id=self.span_id, **self.attributes)
+        return False
+
+
+class Trace:
+    """
+    Spans of one sampled message on this node.
+
+    The trace starts when the message is received and its 'receive' span (the
+    whole handler) is recorded by end(). Every other span is a child of it,
+    unless another parent_id is given.
+    """
+
+    sampled = True
+
+    def __init__(self, tracer, trace_id, remote_parent_id):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.root_id = _new_id()
+        self.remote_parent_id = remote_parent_id
+        self.start_ns = time.time_ns()
+
+    def span(self, name, parent_id=None, **attributes):
+        """Context manager recording the time spent in its block as one span."""
+        return _Span(self, name, parent_id or self.root_id, attributes)
+
+    def record(self, name, start_ns, end_ns, parent_id=None, span_id=None, **attributes):
+        """Records a span that has already happened (e.g. the emulated delay)."""
+        self.tracer.add({
+            'trace_id': self.trace_id,
+            'span_id': span_id or _new_id(),
+            'parent_id': parent_id or self.root_id,
+            'node': self.tracer.node_id,
+            'name': name,
+            'start_ns': start_ns,
+            'duration_ns': end_ns - start_ns,
+            'attributes': {key: str(value) for key, value in attributes.items()},
+        })
+
+    def metadata(self, span):
+        """gRPC metadata that makes span the parent of the receive span on the next node."""
+        return ((TRACE_METADATA_KEY, f"{self.trace_id}-{span.span_id}"),)
+
+    def end(self):
+        self.record('receive', self.start_ns, time.time_ns(), parent_id=self.remote_parent_id or '',
+                    span_id=self.root_id)
+
+
+class Tracer:
+    """
+    Opt-in timing spans of the hot path of sampled messages.
+
+    Whether a message is sampled only depends on its id, so with the same
+    sample_rate every node traces the same messages and the trace id (also
+    derived from the message id) is the same on all of them. The span context
+    travels in the gRPC metadata of the forwarded calls, which links the receive
+    span of a node to the rpc span of its sender, so a full cross-node trace can
+    be reassembled from the dumps of all nodes (collect_traces.py).
+
+    Spans are kept in a ring buffer of capacity spans (GetTraces RPC) and, with
+    a path, also appended to that file as JSON lines.
+    """
+
+    def __init__(self, node_id, sample_rate=0.0, capacity=10000, path=None):
+        self.node_id = node_id
+        self.sample_rate = sample_rate
+        self._threshold = int(sample_rate * (1 << 64))
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=capacity)
+        self._file = open(path, 'a') if path else None
+        self.recorded = 0
+
+    def start(self, message_id, metadata=None):
+        """The trace of a received message, NULL_TRACE if it is not sampled."""
+        if self._threshold <= 0 or int.from_bytes(message_id[:8], 'big') >= self._threshold:
+            return NULL_TRACE
+        remote_parent_id = None
+        for key, value in metadata or ():
+            if key == TRACE_METADATA_KEY:
+                remote_parent_id = value.split('-', 1)[1]
+        return Trace(self, message_id[:8].hex(), remote_parent_id)
+
+    def add(self, span):
+        with self._lock:
+            self._spans.append(span)
+            self.recorded += 1
+            if self._file is not None:
+                self._file.write(json.dumps(span) + "\n")
+
+    def dump(self, clear=False):
+        """The spans still in the ring buffer, oldest first."""
+        with self._lock:
+            spans = list(self._spans)
+            if clear:
+                self._spans.clear()
+            if self._file is not None:
+                self._file.flush()
+        return spans
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        return {'trace_spans_recorded': self.recorded, 'trace_spans_buffered': len(self._spans)}
@@ -0,0 +1,351 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent import futures
+import grpc
+import gossip_pb2_grpc
+import protocol
+from channel_pool import ChannelPool
+from event_logger import EventLogger, JsonLineSink, create_sink
+from gossip_sim import load_neighbors
+from metrics import Gauge
+from scheduler import DelayScheduler
+from node import Node
+
+# Virtual cluster: every node of a topology as a Node object in this one process,
+# no Kubernetes and no sockets. The nodes are wired from the topology JSON, send
+# to each other through an in-process transport (the stubs call the handlers of
+# the target node directly) and keep their latency emulation and event logging,
+# so a 1,000-5,000 node topology runs on a single box in seconds, e.g.
+#
+# python virtual_cluster.py --topology topology/nodes300_Feb092025140642_BA2.json --events events.jsonl
+#
+# With the defaults (PROPAGATION_MODE=async, FANOUT_MODE=parallel,
+# LATENCY_EMULATION=timer), which don't hold a thread per pending send, all nodes
+# share one forwarder pool, one sender pool and one delay scheduler instead of
+# threads of their own. Any helm value can be changed with --set KEY=VALUE, only
+# TRANSPORT=unary is emulated. With PROPAGATION_MODE=sync a call holds its caller's
+# sender thread and a server thread until its whole subtree is done, so shared
+# pools would run dry and hang. There every node gets pools of its own, sized by
+# SENDER_WORKERS and SERVER_WORKERS like on a pod, and hangs where a pod would.
+
+DEFAULT_CONFIG = {
+    'LATENCY_OPTION': 'weight',
+    'PROPAGATION_MODE': 'async',
+    'FANOUT_MODE': 'parallel',
+    'LATENCY_EMULATION': 'timer',
+    'LOG_MODE': 'async',
+    'TRANSPORT': 'unary',
+    'SEND_QUEUE': 'off',
+    'DEDUP_CAPACITY': '10000',
+}
+
+
+class InProcessError(grpc.RpcError):
+    """Failed in-process call, with the code() and details() of a grpc.RpcError."""
+
+    def __init__(self, code, details):
+        super().__init__(details)
+        self._code = code
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+    def __str__(self):
+        return f"{self._code}: {self._details}"
+
+
+class _Context:
+    """The part of grpc.ServicerContext used by the node handlers."""
+
+    def __init__(self, metadata):
+        self._metadata = tuple(metadata or ())
+
+    def invocation_metadata(self):
+        return self._metadata
+
+    def peer(self):
+        return "in-process"
+
+
+class InProcessChannel:
+    """
+    Channel of a node in the same process.
+
+    gossip_pb2_grpc.GossipServiceStub works on it unchanged: every method of the
+    stub calls the handler of the same name on the node, with the request object
+    itself (nothing is serialized). With an executor the handler runs on it, like
+    on a server worker, and the caller waits up to its timeout for the result.
+    Only unary calls are emulated, streams and batches need TRANSPORT=unary.
+    """
+
+    def __init__(self, node, executor=None, in_flight=None):
+        self.node = node
+        self.executor = executor
+        self.in_flight = in_flight if in_flight is not None else Gauge()
+
+    def unary_unary(self, method, *args, **kwargs):
+        handler = getattr(self.node, method.rsplit('/', 1)[1])
+
+        def call(request, metadata=None, timeout=None, **kwargs):
+            return self._call(handler, request, metadata, timeout)
+        return call
+
+    stream_stream = unary_unary
+
+    def _call(self, handler, request, metadata, timeout):
+        self.in_flight.inc()
+        try:
+            if self.executor is None:
+                return handler(request, _Context(metadata))
+            return self.executor.submit(handler, request, _Context(metadata)).result(timeout)
+        except futures.TimeoutError:
+            raise InProcessError(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline Exceeded")
+        except grpc.RpcError:
+            raise
+        except Exception as e:
+            raise InProcessError(grpc.StatusCode.UNKNOWN, f"{type(e).__name__}: {e}")
+        finally:
+            self.in_flight.dec()
+
+    def close(self):
+        pass
+
+
+class VirtualResolver:
+    """Resolver of the virtual cluster, the address of a node is its name."""
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def resolve_all(self, pod_names):
+        return {pod_name: self.resolve(pod_name) for pod_name in pod_names}
+
+    def resolve(self, pod_name):
+        return pod_name if pod_name in self.names else None
+
+    def wait_for(self, pod_names, timeout=120.0):
+        return [pod_name for pod_name in pod_names if pod_name not in self.names]
+
+    def start_watch(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {'resolver_nodes': len(self.names)}
+
+
+class CoverageSink:
+    """
+    Event sink of the virtual cluster.
+
+    Passes the events on to sink (None - drop them) and keeps the initiation
+    time of every message and the first receive time of every node, for the
+    coverage report.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self._lock = threading.Lock()
+        self.initiated = {}  # message -> initiate timestamp (ns)
+        self.first_received = {}  # message -> {receiver -> received timestamp (ns)}
+        self.duplicates = 0
+
+    def write(self, events):
+        with self._lock:
+            for event in events:
+                if event['event_type'] == 'initiate':
+                    self.initiated[event['message']] = event['received_timestamp']
+                elif event['event_type'] == 'received':
+                    self.first_received.setdefault(event['message'], {}).setdefault(
+                        event['receiver_id'], event['received_timestamp'])
+                elif event['event_type'] == 'duplicate':
+                    self.duplicates += 1
+        if self.sink is not None:
+            self.sink.write(events)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+class VirtualCluster:
+    """The nodes of one topology, running in this process and talking over InProcessChannels."""
+
+    def __init__(self, topology, config, event_logger, service_name="bcgossip-svc", forward_threads=256,
+                 sender_threads=256):
+        if config.get('TRANSPORT', 'unary') != 'unary':
+            raise ValueError(f"the virtual cluster only emulates TRANSPORT=unary, not {config['TRANSPORT']}")
+        self.config = config
+        self.event_logger = event_logger
+        self.names, neighbors = load_neighbors(topology, config['LATENCY_OPTION'])
+
+        # Shared pools, only for async propagation where no thread waits for a subtree
+        self.shared = config.get('PROPAGATION_MODE', 'sync') == 'async'
+        self.forward_executor = None
+        self.sender_pool = None
+        self.scheduler = None
+        if self.shared:
+            self.forward_executor = futures.ThreadPoolExecutor(max_workers=forward_threads,
+                                                               thread_name_prefix="forwarder")
+            self.sender_pool = futures.ThreadPoolExecutor(max_workers=sender_threads, thread_name_prefix="sender")
+            if config.get('LATENCY_EMULATION') == 'timer':
+                self.scheduler = DelayScheduler(self.sender_pool)
+        # Blocking (sync) handlers hold the caller until their subtree is done, they run on
+        # SERVER_WORKERS threads of their node like on a gRPC server, instead of growing the
+        # caller's stack
+        self.server_pools = {}
+
+        # Handler calls running right now, for wait_until_idle()
+        self.in_flight = Gauge()
+        self.resolver = VirtualResolver(self.names)
+        self.channels = ChannelPool(gossip_pb2_grpc.GossipServiceStub, options=[],
+                                    channel_factory=self._open_channel)
+
+        self.nodes = {}
+        for name in self.names:
+            self.nodes[name] = Node(service_name, config=config, pod_name=name, neighbor_pods=neighbors[name],
+                                    resolver=self.resolver, channels=self.channels, event_logger=event_logger,
+                                    forward_executor=self.forward_executor, sender_pool=self.sender_pool,
+                                    scheduler=self.scheduler)
+
+    def _open_channel(self, target, options=None):
+        name = target.rsplit(':', 1)[0]
+        server_pool = None
+        if not self.shared:
+            if name not in self.server_pools:
+                self.server_pools[name] = futures.ThreadPoolExecutor(
+                    max_workers=int(self.config.get('SERVER_WORKERS', '10')), thread_name_prefix=f"server-{name}")
+            server_pool = self.server_pools[name]
+        return InProcessChannel(self.nodes[name], server_pool, self.in_flight)
+
+    def initiate(self, origin, text, timeout=None):
+        """
+        Starts a message at origin, the same call start.py makes to the pod. A sync
+        propagation returns when it is done, grpc.RpcError (DEADLINE_EXCEEDED) after
+        timeout seconds.
+        """
+        request = protocol.new_message(text, origin_id=origin, origin_timestamp=time.time_ns())
+        return self.channels.get_stub(f"{origin}:5050").SendMessage(request, timeout=timeout)
+
+    def busy(self):
+        return self.in_flight.value > 0 or any(node.forwarder.pending() for node in self.nodes.values())
+
+    def wait_until_idle(self, timeout=None, poll_interval=0.05):
+        """
+        Blocks until no message is in flight anywhere (twice in a row, with no new
+        events in between). Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        logged = -1
+        while True:
+            if not self.busy() and self.event_logger.logged == logged:
+                return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            logged = -1 if self.busy() else self.event_logger.logged
+            time.sleep(poll_interval)
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        for node in self.nodes.values():
+            if not self.shared and node.scheduler is not None:
+                node.scheduler.stop()
+            node.fanout.shutdown()
+        for pool in [self.forward_executor, self.sender_pool] + list(self.server_pools.values()):
+            if pool is not None:
+                pool.shutdown(wait=False)
+        self.event_logger.close()
+
+
+def report(coverage, total_nodes):
+    """Prints the coverage and first-receive times of every message."""
+    print(f"{'message':<24}{'reached':>10}{'p50 (ms)':>12}{'p90 (ms)':>12}{'full (ms)':>12}", flush=True)
+    for message, initiated in coverage.initiated.items():
+        # The initiator is reached at initiation
+        times = sorted((received - initiated) / 1e6 for received in coverage.first_received.get(message, {}).values())
+        reached = len(times) + 1
+        full = f"{times[-1]:.1f}" if times and reached == total_nodes else "-"
+        p50 = times[len(times) // 2] if times else 0.0
+        p90 = times[min(len(times) - 1, int(len(times) * 0.9))] if times else 0.0
+        print(f"{message[:23]:<24}{f'{reached}/{total_nodes}':>10}{p50:>12.1f}{p90:>12.1f}{full:>12}", flush=True)
+    print(f"duplicates: {coverage.duplicates}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Usage: python virtual_cluster.py --topology <json> [--events <jsonl>]")
+    parser.add_argument('--topology', required=True, help="Topology JSON (topology/ or topology_kmeans/ file)")
+    parser.add_argument('--initiator', default='', help="Node that initiates the messages (default: the first node)")
+    parser.add_argument('--messages', type=int, default=1, help="Messages to initiate")
+    parser.add_argument('--interval', type=float, default=0.0, help="Seconds between the initiations")
+    parser.add_argument('--events', default='', help="Write the events to this JSON lines file")
+    parser.add_argument('--set', nargs='*', default=[], metavar='KEY=VALUE',
+                        help="Node setting (helm value env name), e.g. FANOUT_MODE=sequential LATENCY_EMULATION=sleep")
+    parser.add_argument('--forward_threads', type=int, default=256, help="Forwarder pool shared by the nodes (async propagation)")
+    parser.add_argument('--sender_threads', type=int, default=256, help="Sender pool shared by the nodes (async propagation)")
+    parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for the messages to settle")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, **os.environ)
+    config.update(setting.split('=', 1) for setting in args.set)
+    if config.get('TRANSPORT', 'unary') != 'unary':
+        parser.error(f"only TRANSPORT=unary is emulated, not {config['TRANSPORT']}")
+
+    with open(args.topology, 'r') as f:
+        topology = json.load(f)
+
+    # Events go to the file (JSON lines) or, with LOG_SINK=binary, to the LOG_DIR files
+    sink = None
+    if args.events:
+        sink = JsonLineSink(open(args.events, 'wb'))
+    elif config.get('LOG_SINK') == 'binary':
+        sink = create_sink('binary', 'virtual', directory=config.get('LOG_DIR', 'events'))
+    coverage = CoverageSink(sink)
+    event_logger = EventLogger(coverage, asynchronous=config['LOG_MODE'] == 'async',
+                               batch_size=int(config.get('LOG_BATCH_SIZE', '256')),
+                               flush_interval=float(config.get('LOG_FLUSH_INTERVAL', '0.5')),
+                               max_queue=int(config.get('LOG_MAX_QUEUE', '1000000')))
+
+    start = time.perf_counter()
+    cluster = VirtualCluster(topology, config, event_logger, forward_threads=args.forward_threads,
+                             sender_threads=args.sender_threads)
+    print(f"Started {len(cluster.nodes)} virtual nodes in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({config['PROPAGATION_MODE']}, {config['FANOUT_MODE']}, {config['LATENCY_EMULATION']})", flush=True)
+
+    initiator = args.initiator or cluster.names[0]
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.timeout
+    settled = True
+    for i in range(args.messages):
+        try:
+            cluster.initiate(initiator, f"virtual-{i}-{time.time_ns()}", timeout=max(0.0, deadline - time.monotonic()))
+        except grpc.RpcError as e:
+            print(f"Message {i} did not finish in {args.timeout} s: {e}", flush=True)
+            settled = False
+            break
+        if args.interval:
+            time.sleep(args.interval)
+    settled = settled and cluster.wait_until_idle(timeout=max(0.0, deadline - time.monotonic()))
+    elapsed = time.perf_counter() - start
+    event_logger.flush()
+    print(f"{args.messages} messages from {initiator} {'settled' if settled else 'still running'} "
+          f"after {elapsed:.2f} s, {event_logger.logged} events", flush=True)
+    report(coverage, len(cluster.nodes))
+    # Sends that started late, the box is short of CPU for this many nodes when it grows
+    if cluster.scheduler is not None:
+        jitter = cluster.scheduler.stats()
+        print(f"latency emulation jitter: p50={jitter['jitter_p50_ms']:.1f} ms, p99={jitter['jitter_p99_ms']:.1f} ms, "
+              f"max={jitter['jitter_max_ms']:.1f} ms", flush=True)
+    cluster.stop()
+    if not settled:
+        # Threads still blocked in the nodes would keep the interpreter from exiting
+        os._exit(1)
@@ -4,6 +4,7 @@ import grpc
 import sys
 import gossip_pb2
 import gossip_pb2_grpc
+from channel_pool import ChannelPool, SERVER_KEEPALIVE_OPTIONS
 
 class Node(gossip_pb2_grpc.GossipServiceServicer):
     def __init__(self, node_id, port, peers):
@@ -12,6 +13,8 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         self.peers = peers  # List of other node addresses in "host:port" format
         # print(self.peers)
         self.received_messages = set()
+        # Persistent channels to the peers, reused by every message
+        self.channels = ChannelPool(gossip_pb2_grpc.GossipServiceStub, channel_factory=grpc.aio.insecure_channel)
 
     async def SendMessage(self, request, context):
         message = request.message
@@ -29,16 +32,16 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         peers_to_notify = [peer for peer in self.peers if peer != sender_id]
         # print(peers_to_notify)
         for peer in peers_to_notify:
-            async with grpc.aio.insecure_channel(peer) as channel:
-                try:
-                    stub = gossip_pb2_grpc.GossipServiceStub(channel)
-                    await stub.SendMessage(gossip_pb2.GossipMessage(message=message, sender_id=self.port))
-                    print(f"Node {self.node_id} forwarded message to {peer}")
-                except grpc.aio.AioRpcError as e:
-                    print(f"Failed to send message to {peer}: {e}")
+            stub = self.channels.get_stub(peer)
+            try:
+                await stub.SendMessage(gossip_pb2.GossipMessage(message=message, sender_id=self.port))
+                print(f"Node {self.node_id} forwarded message to {peer}")
+            except grpc.aio.AioRpcError as e:
+                self.channels.report_failure(peer, e)
+                print(f"Failed to send message to {peer}: {e}")
 
     async def start_server(self):
-        server = grpc.aio.server()
+        server = grpc.aio.server(options=SERVER_KEEPALIVE_OPTIONS)
         gossip_pb2_grpc.add_GossipServiceServicer_to_server(self, server)
         server.add_insecure_port(f'[::]:{self.port}')
         print(f"Node {self.node_id} listening on port {self.port}")
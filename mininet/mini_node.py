@@ -4,6 +4,7 @@ import socket
 from concurrent import futures
 import gossip_pb2
 import gossip_pb2_grpc
+from channel_pool import ChannelPool, SERVER_KEEPALIVE_OPTIONS
 import json
 import time
 import logging
@@ -37,6 +38,9 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         self.gossip_initiated = False
         self.initial_gossip_timestamp = None
 
+        # Persistent channels to the neighbors, reused by every message
+        self.channels = ChannelPool(gossip_pb2_grpc.GossipServiceStub)
+
     # Receiving message from other nodes
     # and distribute it to others
     def SendMessage(self, request, context):
@@ -90,7 +94,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
     def gossip_message(self, message, sender_id):
 
         # Get the neighbor and its latency
-        for neighbor_pod_name, neighbor_latency in self.neighbor_pods:
+        for neighbor_pod_name, neighbor_latency in self.neighbor_hosts:
             if neighbor_pod_name != sender_id:
                 # neighbor_ip = self.get_pod_ip(neighbor_pod_name)
                 neighbor_ip = socket.gethostbyname(neighbor_pod_name)
@@ -102,21 +106,21 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
                 # Introduce latency here
                 time.sleep(int(neighbor_latency) / 1000)
 
-                with grpc.insecure_channel(target) as channel:
-                    try:
-                        stub = gossip_pb2_grpc.GossipServiceStub(channel)
-                        stub.SendMessage(gossip_pb2.GossipMessage(
-                            message=message,
-                            sender_id=self.pod_name,
-                            timestamp=send_timestamp,
-                            latency_ms=neighbor_latency  # neighbor latency in miliseconds
-                        ))
-                        # print(
-                        #     f"{self.pod_name}({self.pod_ip}) forwarded message: '{message}' to {neighbor_pod_name} ({neighbor_ip}) "
-                        #     f"with latency {neighbor_latency} ms",
-                        #     flush=True)
-                    except grpc.RpcError as e:
-                        print(f"Failed to send message: '{message}' to {neighbor_pod_name}: {e}", flush=True)
+                stub = self.channels.get_stub(target)
+                try:
+                    stub.SendMessage(gossip_pb2.GossipMessage(
+                        message=message,
+                        sender_id=self.pod_name,
+                        timestamp=send_timestamp,
+                        latency_ms=neighbor_latency  # neighbor latency in miliseconds
+                    ))
+                    # print(
+                    #     f"{self.pod_name}({self.pod_ip}) forwarded message: '{message}' to {neighbor_pod_name} ({neighbor_ip}) "
+                    #     f"with latency {neighbor_latency} ms",
+                    #     flush=True)
+                except grpc.RpcError as e:
+                    self.channels.report_failure(target, e)
+                    print(f"Failed to send message: '{message}' to {neighbor_pod_name}: {e}", flush=True)
 
     def get_topology(self,topology_folder):
         """
@@ -187,7 +191,7 @@ class Node(gossip_pb2_grpc.GossipServiceServicer):
         """
         Starts the gRPC server for the node.
         """
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_KEEPALIVE_OPTIONS)
         gossip_pb2_grpc.add_GossipServiceServicer_to_server(self, server)
         server.add_insecure_port(f'[::]:{self.port}')
         print(f"{self.pod_name}({self.pod_ip}) listening on port {self.port}", flush=True)